@@ -0,0 +1,272 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""benchmarks for the hot paths of :py:mod:`speakers.bus`
+
+Usage::
+
+    python benchmarks/run.py            # compare against benchmarks/baseline.json
+    python benchmarks/run.py --save     # record a new baseline
+    python benchmarks/run.py -k shout   # only run benchmarks whose name contains "shout"
+
+Exits with status 1 when any benchmark is slower than its baseline
+times ``--tolerance``.
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speakers import bus  # noqa: E402
+from speakers.bus import Speaker  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(number, name=None):
+    """registers a benchmark. The decorated function takes no arguments
+    and returns a ``(setup, operation)`` tuple: ``setup()`` prepares the
+    state, ``operation()`` is timed ``number`` times per round"""
+
+    def decorator(func):
+        BENCHMARKS[name or func.__name__] = (func, number)
+        return func
+
+    return decorator
+
+
+def listener(event, *args, **kw):
+    return None
+
+
+def make_listener():
+    # plugging the same callable twice is a no-op, benchmarks need
+    # distinct listeners
+    return lambda event, *args, **kw: None
+
+
+def fresh_speaker(name='bench', actions=('ready',)):
+    bus.SPEAKERS.clear()
+    return Speaker(name, list(actions))
+
+
+def shout_with(listeners):
+    def prepare():
+        state = {}
+
+        def setup():
+            speaker = fresh_speaker()
+            for _ in range(listeners):
+                speaker.for_decorator('ready', make_listener())
+            state['shout'] = speaker.ready.shout
+
+        def operation():
+            state['shout']('value', key='value')
+
+        return setup, operation
+
+    return prepare
+
+
+benchmark(100000, 'shout_0_listeners')(shout_with(0))
+benchmark(100000, 'shout_1_listener')(shout_with(1))
+benchmark(20000, 'shout_10_listeners')(shout_with(10))
+benchmark(200, 'shout_1000_listeners')(shout_with(1000))
+
+
+@benchmark(500)
+def register_listener():
+    state = {}
+
+    def setup():
+        state['speaker'] = fresh_speaker()
+
+    def operation():
+        state['speaker'].for_decorator('ready', make_listener())
+
+    return setup, operation
+
+
+def unplug_from(listeners):
+    def prepare():
+        state = {}
+
+        def setup():
+            speaker = fresh_speaker()
+            for _ in range(listeners - 1):
+                speaker.for_decorator('ready', make_listener())
+
+            speaker.ready.shout()
+            state['speaker'] = speaker
+
+        def operation():
+            speaker = state['speaker']
+            responder = speaker.for_decorator('ready', listener)
+            speaker.unplug('ready', responder)
+
+        return setup, operation
+
+    return prepare
+
+
+benchmark(20, 'unplug_from_10000_listeners')(unplug_from(10000))
+
+
+@benchmark(1)
+def register_10000_listeners_then_shout():
+    state = {}
+
+    def setup():
+        state['speaker'] = fresh_speaker()
+        state['listeners'] = [make_listener() for _ in range(10000)]
+
+    def operation():
+        speaker = state['speaker']
+        for callback in state['listeners']:
+            speaker.for_decorator('ready', callback)
+
+        speaker.ready.shout()
+
+    return setup, operation
+
+
+@benchmark(20)
+def unplug_from_1000_listeners():
+    state = {}
+
+    def setup():
+        speaker = fresh_speaker()
+        for _ in range(999):
+            speaker.for_decorator('ready', make_listener())
+
+        state['speaker'] = speaker
+
+    def operation():
+        speaker = state['speaker']
+        responder = speaker.for_decorator('ready', listener)
+        speaker.unplug('ready', responder)
+
+    return setup, operation
+
+
+@benchmark(5)
+def release_all_1000_speakers():
+    def setup():
+        bus.SPEAKERS.clear()
+
+    def operation():
+        speakers = [Speaker('bench{0}'.format(i), ['ready', 'loading']) for i in range(1000)]
+        for speaker in speakers:
+            speaker.for_decorator('ready', listener)
+            speaker.for_decorator('loading', listener)
+
+        Speaker.release_all()
+
+    return setup, operation
+
+
+@benchmark(20)
+def construct_speaker_with_1000_actions():
+    actions = ['action {0}'.format(i) for i in range(1000)]
+
+    def setup():
+        bus.SPEAKERS.clear()
+
+    def operation():
+        Speaker('bench', actions)
+
+    return setup, operation
+
+
+def measure(prepare, number, rounds):
+    """returns the best time per operation, in seconds"""
+    setup, operation = prepare()
+    timer = timeit.Timer(operation, setup=setup)
+    gc.collect()
+    return min(timer.repeat(repeat=rounds, number=number)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE, help='path to the baseline json file')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='fail when a benchmark is slower than baseline * tolerance (default: 1.5)')
+    parser.add_argument('--rounds', type=int, default=5, help='best of how many rounds (default: 5)')
+    parser.add_argument('-k', dest='keyword', default='', help='only run benchmarks matching this keyword')
+    options = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as fd:
+            baseline = json.load(fd)
+
+    results = OrderedDict()
+    regressions = []
+    for name, (prepare, number) in BENCHMARKS.items():
+        if options.keyword not in name:
+            continue
+
+        results[name] = elapsed = measure(prepare, number, options.rounds)
+        expected = baseline.get(name)
+        status = ''
+        if expected:
+            ratio = elapsed / expected
+            status = '{0:.2f}x baseline'.format(ratio)
+            if ratio > options.tolerance:
+                status += ' REGRESSION'
+                regressions.append(name)
+
+        print('{0:<40} {1:>12.3f} us  {2}'.format(name, elapsed * 1000000, status))
+
+    bus.SPEAKERS.clear()
+    if options.save:
+        baseline.update(results)
+        with open(options.baseline, 'w') as fd:
+            json.dump(baseline, fd, indent=2, sort_keys=True)
+            fd.write('\n')
+
+        print('saved baseline to {0}'.format(options.baseline))
+        return 0
+
+    if regressions:
+        print('{0} benchmark(s) regressed beyond {1}x: {2}'.format(
+            len(regressions), options.tolerance, ', '.join(regressions)), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
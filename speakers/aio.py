@@ -0,0 +1,232 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""asyncio support for speakers, requires python 3.5+"""
+import asyncio
+import functools
+
+from .breaker import Guarded
+from .bus import BatchOfOne, WeakCallback
+from .caching import Memoized, _missing
+from .deadline import Deadline, ShoutResult
+from .handy import Wrapper
+from .routing import Filtered, matches
+from .stats import Instrumented, clock
+
+
+async def _measure(stats, coroutine):
+    started = clock()
+    try:
+        result = await coroutine
+    except Exception:
+        stats.record(clock() - started, failed=True)
+        raise
+
+    stats.record(clock() - started, result)
+    return result
+
+
+def _target(callback):
+    """returns the function a listener ends up calling, looking
+    through the wrappers added when its plan was compiled"""
+    while True:
+        if isinstance(callback, WeakCallback):
+            callback = callback.reference()
+        elif isinstance(callback, Wrapper):
+            callback = callback.callback
+        else:
+            return callback
+
+
+async def _await(callback, speaker, args, kw):
+    """awaits an ``async def`` listener through its wrappers, which
+    would otherwise only see the coroutine object. Wrappers without an
+    adapter below do not change how the hook is called."""
+    adapter = _adapters.get(type(callback))
+    if adapter is not None:
+        return await adapter(callback, speaker, args, kw)
+
+    if isinstance(callback, Wrapper):
+        return await _await(callback.callback, speaker, args, kw)
+
+    return await callback(speaker, *args, **kw)
+
+
+async def _weak(callback, speaker, args, kw):
+    target = callback.reference()
+    if target is not None:
+        return await _await(target, speaker, args, kw)
+
+
+async def _filtered(callback, speaker, args, kw):
+    if matches(callback.where, kw):
+        return await _await(callback.callback, speaker, args, kw)
+
+
+async def _instrumented(callback, speaker, args, kw):
+    return await _measure(callback.stats, _await(callback.callback, speaker, args, kw))
+
+
+async def _guarded(callback, speaker, args, kw):
+    breaker = callback.breaker
+    if not breaker.allow():
+        return None
+
+    started = clock()
+    try:
+        result = await _await(callback.callback, speaker, args, kw)
+    except asyncio.CancelledError:
+        # losing listeners are cancelled, that says nothing about the hook
+        breaker.abandon()
+        raise
+    except Exception:
+        breaker.record(clock() - started, failed=True)
+        raise
+    except BaseException:
+        breaker.abandon()
+        raise
+
+    breaker.record(clock() - started)
+    return result
+
+
+async def _memoized(callback, speaker, args, kw):
+    # the awaited result is cached, never the coroutine
+    key = callback.key_of((speaker,) + args, kw)
+    try:
+        result = callback.cache.get(key)
+    except TypeError:
+        return await _await(callback.callback, speaker, args, kw)
+
+    if result is _missing:
+        result = await _await(callback.callback, speaker, args, kw)
+        callback.cache.set(key, result)
+
+    return result
+
+
+async def _batch_of_one(callback, speaker, args, kw):
+    return await _await(callback.callback, speaker, ([args],), kw)
+
+
+_adapters = {
+    WeakCallback: _weak,
+    Filtered: _filtered,
+    Instrumented: _instrumented,
+    Guarded: _guarded,
+    Memoized: _memoized,
+    BatchOfOne: _batch_of_one,
+}
+
+
+async def _listen(loop, speaker, owner, callback, args, kw):
+    try:
+        if asyncio.iscoroutinefunction(_target(callback)):
+            return await _await(callback, speaker, args, kw)
+
+        return await loop.run_in_executor(
+            speaker.thread_pool, functools.partial(callback, speaker, *args, **kw))
+
+    except asyncio.CancelledError:
+        raise
+
+    except Exception as exc:
+        return owner._exception_handler(speaker, exc, args, kw)
+
+
+async def ashout(speaker, action, *args, **kw):
+    """awaits all the listeners of the given action concurrently.
+
+    ``async def`` listeners run as tasks in the current event loop
+    while regular listeners run in the speaker's ``thread_pool``, or
+    the loop's default executor when there is none. The
+    first truthy result to arrive wins and the listeners that are still
+    pending get cancelled. Notice that a sync listener that already
+    started running in the executor cannot be interrupted, its result
+    is just discarded.
+    """
+    dispatched = speaker.dispatch_order(action)
+    if not dispatched:
+        return None
+
+    loop = asyncio.get_event_loop()
+    tasks = [asyncio.ensure_future(_listen(loop, speaker, hook.speaker, callback, args, kw))
+             for hook, callback in dispatched]
+    try:
+        for answer in asyncio.as_completed(tasks):
+            result = await answer
+            if result:
+                return result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def ashout_within(speaker, action, timeout, *args, **kw):
+    """:py:func:`ashout` with a time budget, either in seconds or a
+    shared :py:class:`speakers.deadline.Deadline`. Returns a
+    :py:class:`speakers.deadline.ShoutResult`: the listeners that
+    finished before the first truthy result or the end of the budget
+    ran, those still pending once the budget is over are cancelled and
+    reported as timed out. Listeners cancelled because another one
+    answered first do not show up in any list.
+    """
+    deadline = Deadline.of(timeout)
+    outcome = ShoutResult()
+    dispatched = speaker.dispatch_order(action)
+    if not dispatched:
+        return outcome
+
+    loop = asyncio.get_event_loop()
+    tasks = [(hook, asyncio.ensure_future(_listen(loop, speaker, hook.speaker, callback, args, kw)))
+             for hook, callback in dispatched]
+    pending = set(task for hook, task in tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+
+            for hook, task in tasks:
+                if task in done and task.result():
+                    outcome.result = task.result()
+                    break
+
+            if outcome.result is not None:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    for hook, task in tasks:
+        if task not in pending:
+            outcome.ran.append(hook)
+        elif outcome.result is None:
+            outcome.timed_out.append(hook)
+
+    return outcome
@@ -0,0 +1,197 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""per-hook circuit breakers, see :py:meth:`speakers.bus.Speaker.enable_circuit_breakers`"""
+import logging
+import threading
+from collections import deque
+
+from .handy import Wrapper
+from .stats import clock
+
+logger = logging.getLogger('speakers')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# ranks the states from the least to the most healthy circuit
+HEALTH = {OPEN: 0, HALF_OPEN: 1, CLOSED: 2}
+
+
+class CircuitBreaker(object):
+    """tracks the outcome of the last ``window`` calls of a hook.
+
+    A call is bad when it raises or, given ``slow_seconds``, when it
+    takes longer than that. Once at least ``min_calls`` were recorded
+    and the ratio of bad calls reaches ``failure_rate`` the circuit
+    opens and the hook is skipped. After ``reset_timeout`` seconds a
+    single probe call is let through (half-open): the circuit closes
+    if it goes well and opens again otherwise.
+
+    ``on_state_change`` is called with ``(key, old_state, new_state)``
+    whenever the circuit changes state.
+    """
+
+    def __init__(self, key, failure_rate=0.5, slow_seconds=None, window=20, min_calls=5,
+                 reset_timeout=30.0, on_state_change=None):
+        if not 0 < failure_rate <= 1:
+            raise ValueError('failure_rate must be within (0, 1], got {0!r}'.format(failure_rate))
+
+        self.key = key
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.min_calls = min(min_calls, window)
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.outcomes = deque(maxlen=window)
+        self.bad = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.probing = False
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """returns whether the hook may be called right now"""
+        if self.state is CLOSED:
+            return True
+
+        with self.lock:
+            if self.state is OPEN and clock() - self.opened_at >= self.reset_timeout:
+                changed = self._transition(HALF_OPEN)
+            else:
+                changed = None
+
+            allowed = self.state is HALF_OPEN and not self.probing
+            if allowed:
+                self.probing = True
+            else:
+                self.skipped += 1
+
+        self._notify(changed)
+        return allowed
+
+    def record(self, elapsed, failed=False):
+        bad = failed or (self.slow_seconds is not None and elapsed > self.slow_seconds)
+        with self.lock:
+            if self.state is HALF_OPEN:
+                self.probing = False
+                changed = self._transition(OPEN if bad else CLOSED)
+            elif self.state is CLOSED:
+                changed = self._count(bad)
+            else:
+                changed = None
+
+        self._notify(changed)
+
+    def abandon(self):
+        """gives back the probe of a half-open circuit when the call was
+        interrupted, e.g. cancelled, before its outcome was recorded, so
+        that the next call probes again"""
+        with self.lock:
+            if self.state is HALF_OPEN:
+                self.probing = False
+
+    def _count(self, bad):
+        outcomes = self.outcomes
+        if len(outcomes) == outcomes.maxlen:
+            self.bad -= outcomes[0]
+
+        outcomes.append(bad)
+        self.bad += bad
+        if len(outcomes) >= self.min_calls and self.bad >= self.failure_rate * len(outcomes):
+            return self._transition(OPEN)
+
+    def _transition(self, state):
+        previous, self.state = self.state, state
+        if state is OPEN:
+            self.opened_at = clock()
+        elif state is CLOSED:
+            self.outcomes.clear()
+            self.bad = 0
+
+        return previous, state
+
+    def _notify(self, changed):
+        if changed is None:
+            return
+
+        previous, state = changed
+        logger.warning('circuit of %s changed from %s to %s', self.key, previous, state)
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(self.key, previous, state)
+            except Exception:
+                logger.exception('state change callback of %s failed', self.key)
+
+    def reset(self):
+        """closes the circuit and forgets the recorded calls"""
+        with self.lock:
+            self.probing = False
+            changed = self._transition(CLOSED) if self.state is not CLOSED else None
+
+        self._notify(changed)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'key': self.key,
+                'state': self.state,
+                'calls': len(self.outcomes),
+                'bad': self.bad,
+                'skipped': self.skipped,
+            }
+
+
+class Guarded(Wrapper):
+    """calls a hook callback through its :py:class:`CircuitBreaker`,
+    skipped calls return ``None`` so that the next hooks are shouted.
+    Exceptions are recorded and still reach the exception handler."""
+
+    __slots__ = ('breaker',)
+
+    def __init__(self, callback, breaker):
+        self.callback = callback
+        self.breaker = breaker
+
+    def __call__(self, *args, **kw):
+        breaker = self.breaker
+        if not breaker.allow():
+            return None
+
+        started = clock()
+        try:
+            result = self.callback(*args, **kw)
+        except Exception:
+            breaker.record(clock() - started, failed=True)
+            raise
+        except BaseException:
+            breaker.abandon()
+            raise
+
+        breaker.record(clock() - started)
+        return result
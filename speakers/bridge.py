@@ -0,0 +1,357 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""forwards shouts to other processes on the same host.
+
+A :py:class:`BridgePublisher` plugs a hook into the selected actions
+of a speaker, the events it hears are pickled, batched and sent over
+persistent unix domain socket (or loopback TCP) connections to every
+peer. Each peer runs a :py:class:`BridgeReceiver` that shouts the
+events into its local speaker of the same name.
+
+Frames are a 4 bytes big-endian length followed by the events of the
+batch, each one also prefixed by its 4 bytes length. Events are
+unpickled on arrival, so only connect processes that trust each other.
+"""
+import logging
+import os
+import pickle
+import socket
+import struct
+import sys
+import threading
+from collections import deque
+
+from .bus import SPEAKERS
+
+logger = logging.getLogger('speakers')
+
+LENGTH = struct.Struct('!I')
+#: forwarding hooks run before every local hook, so that local hooks
+#: returning a truthy result do not keep events from the peers
+FORWARD_PRIORITY = sys.maxsize
+
+_relaying = threading.local()
+
+
+def encode_frame(events):
+    """packs a list of already serialized events into a single frame"""
+    payload = b''.join(LENGTH.pack(len(event)) + event for event in events)
+    return LENGTH.pack(len(payload)) + payload
+
+
+def decode_frame(payload):
+    """splits the payload of a frame into its serialized events"""
+    events = []
+    offset = 0
+    while offset < len(payload):
+        size, = LENGTH.unpack_from(payload, offset)
+        offset += LENGTH.size
+        events.append(payload[offset:offset + size])
+        offset += size
+
+    return events
+
+
+def _receive_exactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(size)
+        if not chunk:
+            return None
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def read_frames(connection):
+    """yields the events of every frame read from the connection until it is closed"""
+    while True:
+        header = _receive_exactly(connection, LENGTH.size)
+        if header is None:
+            return
+
+        size, = LENGTH.unpack(header)
+        payload = _receive_exactly(connection, size)
+        if payload is None:
+            return
+
+        for event in decode_frame(payload):
+            yield event
+
+
+def relay(speaker, action, args, kw):
+    """shouts an event that came from another process into the local
+    speaker, forwarding hooks ignore it"""
+    _relaying.active = True
+    try:
+        speaker.shout(action, *args, **kw)
+    except Exception:
+        logger.exception('failed to relay %s to %s', action, speaker)
+    finally:
+        _relaying.active = False
+
+
+def _family(address):
+    return socket.AF_UNIX if isinstance(address, (str, bytes)) else socket.AF_INET
+
+
+def is_relaying():
+    """whether the current thread is dispatching an event that came
+    from another process"""
+    return getattr(_relaying, 'active', False)
+
+
+class ConnectionPool(object):
+    """keeps one persistent connection per address, reconnecting on failure"""
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self.connections = {}
+
+    def send(self, address, data):
+        """sends the data, retrying once on a fresh connection"""
+        for attempt in (1, 2):
+            connection = self.connections.get(address)
+            try:
+                if connection is None:
+                    connection = socket.socket(_family(address), socket.SOCK_STREAM)
+                    connection.settimeout(self.timeout)
+                    connection.connect(address)
+                    self.connections[address] = connection
+
+                connection.sendall(data)
+                return True
+            except (OSError, socket.error):
+                self.discard(address)
+                if attempt == 2:
+                    raise
+
+    def discard(self, address):
+        connection = self.connections.pop(address, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for address in list(self.connections):
+            self.discard(address)
+
+
+class BridgePublisher(object):
+    """batches the shouts of the forwarded actions and sends them to
+    ``peers``, a list of addresses or a callable returning one.
+    Addresses are unix socket paths or ``(host, port)`` tuples.
+
+    A background thread sends a frame as soon as ``batch_size`` events
+    are pending or ``flush_interval`` seconds after the first one. When
+    the peers are too slow to keep up and ``max_pending`` events are
+    waiting, new events are dropped and counted in :py:attr:`dropped`.
+    """
+
+    def __init__(self, peers, batch_size=256, flush_interval=0.005, protocol=pickle.HIGHEST_PROTOCOL,
+                 max_pending=65536):
+        self.peers = peers
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.protocol = protocol
+        self.pool = ConnectionPool()
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.send_lock = threading.Lock()
+        self.forwarded = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.work, name='speakers-bridge-publisher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def forward(self, speaker, actions):
+        """plugs a forwarding hook into each of the given actions of the speaker"""
+        for action in actions:
+            hook = self.hook_for(speaker.registry_key, action)
+            speaker.for_decorator(action, hook, priority=FORWARD_PRIORITY)
+            self.forwarded.append((speaker, action, hook))
+
+    def hook_for(self, name, action):
+        def forward(event, *args, **kw):
+            if is_relaying():
+                return
+
+            try:
+                serialized = pickle.dumps((name, action, args, kw), self.protocol)
+            except Exception:
+                # the local shout goes on, only the peers miss the event
+                self.failed += 1
+                logger.exception('failed to serialize %s of %s to forward it', action, name)
+                return
+
+            self.publish(serialized)
+
+        return forward
+
+    def publish(self, event):
+        """queues a serialized event, returns ``False`` if it was dropped"""
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+
+            self.pending.append(event)
+            if len(self.pending) in (1, self.batch_size):
+                self.condition.notify()
+
+        return True
+
+    def work(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+
+                if not self.running and not self.pending:
+                    return
+
+                if len(self.pending) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+
+            self.flush()
+
+    def flush(self):
+        """sends the pending events right away, returns how many were sent"""
+        with self.send_lock:
+            with self.condition:
+                events = list(self.pending)
+                self.pending.clear()
+
+            if not events:
+                return 0
+
+            peers = self.peers() if callable(self.peers) else self.peers
+            for start in range(0, len(events), self.batch_size):
+                frame = encode_frame(events[start:start + self.batch_size])
+                for address in peers:
+                    try:
+                        self.pool.send(address, frame)
+                    except (OSError, socket.error):
+                        self.failed += 1
+                        logger.exception('failed to forward events to %s', address)
+
+            self.sent += len(events)
+            return len(events)
+
+    def close(self):
+        """unplugs the forwarding hooks, sends what is pending and closes the connections"""
+        for speaker, action, hook in self.forwarded:
+            speaker.unplug(action, hook)
+
+        del self.forwarded[:]
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        self.thread.join()
+        self.flush()
+        self.pool.close()
+
+
+class BridgeReceiver(object):
+    """listens on ``address`` and shouts the events sent by publishers
+    into the local speakers. ``resolve`` maps a speaker name to a local
+    speaker, by default the global registry of speakers. Events for
+    unknown speakers are ignored, those that cannot be unpickled are
+    logged and counted in :py:attr:`failed`."""
+
+    def __init__(self, address, resolve=None, backlog=64):
+        self.resolve = resolve or SPEAKERS.get
+        self.received = 0
+        self.failed = 0
+        self.server = socket.socket(_family(address), socket.SOCK_STREAM)
+        if _family(address) == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        elif os.path.exists(address):
+            os.unlink(address)
+
+        self.server.bind(address)
+        self.server.listen(backlog)
+        self.address = self.server.getsockname()
+        self.running = True
+        self.thread = threading.Thread(target=self.accept, name='speakers-bridge-receiver')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def accept(self):
+        while self.running:
+            try:
+                connection, _ = self.server.accept()
+            except (OSError, socket.error):
+                return
+
+            thread = threading.Thread(target=self.serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, connection):
+        try:
+            for event in read_frames(connection):
+                try:
+                    event = pickle.loads(event)
+                    name, action, args, kw = event
+                except Exception:
+                    # a bad event must not cost the rest of the connection
+                    self.failed += 1
+                    logger.exception('failed to decode an event received on %s', self.address)
+                    continue
+
+                self.relay(event)
+        except (OSError, socket.error):
+            pass
+        finally:
+            connection.close()
+
+    def relay(self, event):
+        name, action, args, kw = event
+        speaker = self.resolve(name)
+        self.received += 1
+        if speaker is not None:
+            relay(speaker, action, args, kw)
+
+    def close(self):
+        self.running = False
+        address = self.address
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except (OSError, socket.error):
+            pass
+
+        self.server.close()
+        self.thread.join()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
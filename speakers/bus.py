@@ -28,15 +28,24 @@ from __future__ import unicode_literals
 
 import os
 import sys
-from collections import OrderedDict, defaultdict
-from functools import wraps
+import pickle
+import threading
+import weakref
+from itertools import count, islice
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
 
 from six import text_type as unicode
 from six import binary_type
 from six import PY3
 
-from .handy import underlinefy, nicepartial
+from .handy import underlinefy, intern_name, nicepartial, PrefixTrie, Wrapper
+from .stats import HookStats, Instrumented
+from .caching import ResultCache, Memoized
+from .breaker import CircuitBreaker, Guarded, HEALTH
+from .routing import Filtered, RoutingIndex, make_filter, matches
 ENCODE = 'utf-8'
+WILDCARD = '*'
 
 
 def force_bytes(s):
@@ -47,27 +56,118 @@ def force_bytes(s):
 
 
 def _function_matches(one, other):
-    one_code = get_code(one)
-    other_code = get_code(other)
-    return (os.path.abspath(one_code.co_filename) == os.path.abspath(other_code.co_filename) and
-            one_code.co_firstlineno == other_code.co_firstlineno)
+    return code_location(one) == code_location(other)
 
 
 def get_code(func):
     return getattr(func, 'func_code', getattr(func, '__code__'))
 
 
+def code_location(func):
+    code = get_code(func)
+    filename = code.co_filename
+    # abspath costs a getcwd() syscall, most code objects already have
+    # an absolute filename that only needs normalizing
+    if os.path.isabs(filename):
+        filename = os.path.normpath(filename)
+    else:
+        filename = os.path.abspath(filename)
+
+    return filename, code.co_firstlineno
+
+
+def _qualified_name(func):
+    return getattr(func, '__qualname__', getattr(func, '__name__', None))
+
+
+def is_reload_of(new, old):
+    """whether ``new`` is the re-imported version of the callable
+    ``old``: a different code object with the same module and qualified
+    name, while the module ``old`` was defined in is no longer the one
+    imported. Callables generated with ``exec`` or defined on the same
+    line share a code location without being reloads."""
+    if new is None or old is None or get_code(new) is get_code(old):
+        return False
+
+    module_name = getattr(old, '__module__', None)
+    if module_name is None or getattr(new, '__module__', None) != module_name:
+        return False
+
+    if _qualified_name(new) != _qualified_name(old):
+        return False
+
+    module = sys.modules.get(module_name)
+    return getattr(module, '__dict__', None) is not getattr(old, '__globals__', None)
+
+
+def identity_key(func):
+    """hashable identity of a callable that does not keep it alive.
+    Bound methods are identified by their instance and function since
+    every attribute access creates a new method object"""
+    owner = getattr(func, '__self__', None)
+    if owner is not None:
+        return id(owner), getattr(func, '__func__', func.__name__)
+
+    return id(func)
+
+
 class Function(object):
+    # filename, module_name and key are computed on first access
+    # because os.path.relpath costs a getcwd() syscall per call
+    __slots__ = ('call', 'name', 'code', 'lineno', 'scope',
+                 '_filename', '_module_name', '_key')
+
     def __init__(self, func):
         self.call = func
         self.name = func.__name__
         self.code = get_code(func)
-        self.filename = os.path.relpath(self.code.co_filename)
         self.lineno = self.code.co_firstlineno + 1
+        self.scope = None
+        self._filename = None
+        self._module_name = None
+        self._key = None
+
+    @property
+    def filename(self):
+        if self._filename is None:
+            self._filename = os.path.relpath(self.code.co_filename)
+
+        return self._filename
+
+    @filename.setter
+    def filename(self, value):
+        self._filename = value
+        self._module_name = None
 
     @property
     def module_name(self):
-        return self.filename_without_extension.replace(os.sep, '.')
+        if self._module_name is None:
+            self._module_name = self.filename_without_extension.replace(os.sep, '.')
+
+        return self._module_name
+
+    @property
+    def key(self):
+        """``speaker:action[module:hook:lineno]``, available once the
+        function is plugged into a speaker"""
+        if self._key is None:
+            if self.scope is None:
+                raise AttributeError('{0} is not plugged into any speaker'.format(self))
+
+            speaker_name, action = self.scope
+            self._key = force_bytes('{speaker}:{action}[{module}:{hook}:{lineno}]'.format(
+                speaker=speaker_name,
+                action=safe_action_name(action),
+                module=self.module_name,
+                hook=self.name,
+                lineno=self.lineno,
+            ))
+
+        return self._key
+
+    @key.setter
+    def key(self, value):
+        self._key = value
 
     @property
     def filename_without_extension(self):
@@ -95,26 +195,469 @@ class Function(object):
         return self.call(*args, **kw)
 
 
-SPEAKERS = OrderedDict()
+class WeakFunction(Function):
+    """a :py:class:`Function` that only holds a weak reference to its
+    callable, ``call`` becomes ``None`` once the callable is collected"""
+
+    __slots__ = ('on_collect', 'reference')
+
+    def __init__(self, func, on_collect=None):
+        self.on_collect = on_collect
+        super(WeakFunction, self).__init__(func)
+
+    @property
+    def call(self):
+        return self.reference()
+
+    @call.setter
+    def call(self, func):
+        self.reference = weak_reference(func, self.on_collect)
+
+
+def weak_reference(func, callback=None):
+    """returns a weak reference to the given callable, bound methods are
+    referenced with :py:class:`weakref.WeakMethod` so that the reference
+    lives as long as the instance they are bound to"""
+    if getattr(func, '__self__', None) is not None:
+        return weakref.WeakMethod(func, callback)
+
+    return weakref.ref(func, callback)
+
+
+class WeakCallback(object):
+    """calls the referent of a weak reference, if it is still alive"""
+
+    __slots__ = ('reference',)
+
+    def __init__(self, reference):
+        self.reference = reference
+
+    def __call__(self, *args, **kw):
+        callback = self.reference()
+        if callback is not None:
+            return callback(*args, **kw)
+
+
+class Hook(object):
+    """a callback plugged into an action of a :py:class:`Speaker`.
+    Calling a hook sends exceptions to the speaker's exception handler"""
+
+    __slots__ = ('speaker', 'responder', 'process', 'batch', 'weak', 'sequence',
+                 'identity', 'location', 'priority', 'cacheable', 'where')
+
+    def __init__(self, speaker, responder, process=False, batch=False, weak=False, sequence=0,
+                 identity=None, location=None, priority=0, cacheable=False, where=()):
+        self.speaker = speaker
+        self.responder = responder
+        self.process = process
+        self.batch = batch
+        self.weak = weak
+        self.sequence = sequence
+        self.identity = identity
+        self.location = location
+        self.priority = priority
+        self.cacheable = cacheable
+        self.where = where
+
+    @property
+    def order(self):
+        """hooks are dispatched by descending priority, then in
+        registration order"""
+        return -self.priority, self.sequence
+
+    @property
+    def callback(self):
+        return self.responder.call
+
+    @property
+    def __name__(self):
+        return self.responder.name
+
+    def __repr__(self):
+        return unicode('Hook({0})'.format(self.responder.key))
+
+    def __call__(self, *args, **kw):
+        return _respond(self.speaker, self.callback, args, kw)
+
+
+SPEAKERS = weakref.WeakValueDictionary()
+
+# serializes the changes of hooks and plans of every speaker, a single
+# lock because changes propagate from parent speakers to their children
+_write_lock = threading.Lock()
+# weak hooks collected while a change was in progress
+_collected = deque()
+#: plans kept per speaker for actions that were not declared, such as
+#: shouted names matching a pattern, the oldest ones are dropped
+UNDECLARED_PLANS = 1024
+# attribute names of each Speaker class, actions cannot take them
+_attributes = {}
+
+
+def _silence(*args, **kw):
+    return None
+
+
+class _Stale(object):
+    """stands in for the plan of an action whose hooks changed, the plan
+    is compiled by the first shout that needs it. Plugging many hooks in
+    a row only compiles once."""
+
+    __slots__ = ('speaker', 'action')
+
+    def __init__(self, speaker, action):
+        self.speaker = speaker
+        self.action = action
+
+    def __call__(self, *args, **kw):
+        return self.speaker._refresh(self.action)(*args, **kw)
+
+
+def _make_shouter(plans, action):
+    def shout(*args, **kw):
+        return plans[action](*args, **kw)
+
+    shout.__name__ = str('shout')
+    return shout
+
+
+class Action(nicepartial):
+    """decorator that plugs callbacks into an action of a speaker, its
+    attributes are shortcuts to the speaker's methods for that action.
+    Only ``shout`` is built upfront, the other shortcuts are created on
+    access."""
+
+    __slots__ = ('shout',)
+
+    def __init__(self, speaker, action):
+        super(Action, self).__init__(speaker.for_decorator, action)
+        if action in speaker._names:
+            self.shout = _make_shouter(speaker._plans, action)
+        else:
+            self.shout = nicepartial(speaker.shout, action)
+
+    @property
+    def speaker(self):
+        return self.func.__self__
+
+    @property
+    def name(self):
+        return self.args[0]
+
+    @property
+    def ashout(self):
+        return nicepartial(self.speaker.ashout, self.name)
+
+    @property
+    def ashout_within(self):
+        return nicepartial(self.speaker.ashout_within, self.name)
+
+    @property
+    def fan_out(self):
+        return nicepartial(self.speaker.fan_out, self.name)
+
+    @property
+    def gather(self):
+        return nicepartial(self.speaker.gather, self.name)
+
+    @property
+    def shout_within(self):
+        return nicepartial(self.speaker.shout_within, self.name)
+
+    @property
+    def fan_out_within(self):
+        return nicepartial(self.speaker.fan_out_within, self.name)
+
+    @property
+    def shout_many(self):
+        return nicepartial(self.speaker.shout_many, self.name)
+
+    @property
+    def emit_async(self):
+        return nicepartial(self.speaker.emit_async, self.name)
+
+    @property
+    def unplug(self):
+        return nicepartial(self.speaker.unplug, self.name)
+
+
+def _restore_speaker(name, actions):
+    speaker = SPEAKERS.get(name)
+    if speaker is None:
+        speaker = Speaker(name, actions)
+
+    return speaker
+
+
+class InProcessPool(Wrapper):
+    """dispatches a callback to the process pool of its speaker and
+    waits for the result. Exceptions raised in the worker process are
+    re-raised in the caller so that they reach the exception handler."""
+
+    __slots__ = ('speaker',)
+
+    def __init__(self, speaker, callback):
+        self.speaker = speaker
+        self.callback = callback
+
+    def __call__(self, *args, **kw):
+        executor = self.speaker.process_pool or self.speaker.use_process_pool()
+        return executor.submit(self.callback, *args, **kw).result()
+
+
+class BatchOfOne(Wrapper):
+    """adapts a batch-capable callback to a regular :py:meth:`Speaker.shout`
+    by handing it a batch with a single item"""
+
+    __slots__ = ()
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, speaker, *args, **kw):
+        return self.callback(speaker, [args], **kw)
+
+
+def is_pattern(action):
+    return action.endswith(WILDCARD)
+
+
+# action names already normalized, shouts of dotted names such as
+# ``file.created`` would otherwise slugify them every time
+_safe_names = {}
+SAFE_NAMES_CACHE_SIZE = 4096
+
+
+def safe_action_name(action):
+    """underlinefies an action name, keeping the trailing wildcard of
+    patterns such as ``file_*`` or ``file.*``"""
+    safe = _safe_names.get(action)
+    if safe is not None:
+        return safe
+
+    if not is_pattern(action):
+        safe = underlinefy(action)
+    else:
+        prefix = action[:-1]
+        if WILDCARD in prefix:
+            raise ValueError('wildcards are only supported at the end of a pattern, got {0!r}'.format(action))
+
+        safe = underlinefy(prefix) + WILDCARD
+
+    if len(_safe_names) >= SAFE_NAMES_CACHE_SIZE:
+        _safe_names.clear()
+
+    _safe_names[action] = safe = intern_name(safe)
+    return safe
+
+
+def _respond(speaker, callback, args, kw, owner=None):
+    try:
+        return callback(speaker, *args, **kw)
+    except Exception as exc:
+        return (owner or speaker)._exception_handler(speaker, exc, args, kw)
+
+
+def _make_plan(speaker, callbacks, index=None, owners=None):
+    if not callbacks:
+        return _silence
+
+    if owners is not None:
+        return _make_inherited_plan(speaker, callbacks, index, owners)
+
+    if index is not None:
+        def plan(*args, **kw):
+            for position in index.match(kw):
+                try:
+                    result = callbacks[position](speaker, *args, **kw)
+                except Exception as exc:
+                    result = speaker._exception_handler(speaker, exc, args, kw)
+
+                if result:
+                    return result
+
+        return plan
+
+    if len(callbacks) == 1:
+        callback = callbacks[0]
+
+        def plan(*args, **kw):
+            try:
+                return callback(speaker, *args, **kw)
+            except Exception as exc:
+                return speaker._exception_handler(speaker, exc, args, kw)
+
+        return plan
+
+    def plan(*args, **kw):
+        for callback in callbacks:
+            try:
+                result = callback(speaker, *args, **kw)
+            except Exception as exc:
+                result = speaker._exception_handler(speaker, exc, args, kw)
+
+            if result:
+                return result
+
+    return plan
+
+
+def _make_inherited_plan(speaker, callbacks, index, owners):
+    """plan of an action with hooks inherited from ancestors, the
+    exceptions of each hook go to the handler of the speaker it was
+    plugged into, given by ``owners``"""
+    positions = range(len(callbacks))
+
+    def plan(*args, **kw):
+        for position in index.match(kw) if index is not None else positions:
+            try:
+                result = callbacks[position](speaker, *args, **kw)
+            except Exception as exc:
+                result = owners[position]._exception_handler(speaker, exc, args, kw)
+
+            if result:
+                return result
+
+    return plan
+
+
+def _dispatch_order(hook):
+    return hook.order
+
+
+class HookTable(object):
+    """the hooks of each action of a speaker in dispatch order. Hooks
+    are stored in a dict per action keyed by identity, so that plugging
+    and unplugging do not copy anything; the ordered tuple of an action
+    is built on the first read after a change and then shared."""
+
+    def __init__(self):
+        self.entries = defaultdict(dict)
+        self.snapshots = {}
+
+    def snapshot(self, action):
+        """returns the hooks of the action, the write lock must be held"""
+        try:
+            return self.snapshots[action]
+        except KeyError:
+            entries = self.entries.get(action)
+            hooks = tuple(sorted(entries.values(), key=_dispatch_order)) if entries else ()
+            self.snapshots[action] = hooks
+            return hooks
+
+    def changed(self, action):
+        self.snapshots.pop(action, None)
+
+    def discard(self, action):
+        self.entries.pop(action, None)
+        self.snapshots.pop(action, None)
+
+    def __getitem__(self, action):
+        try:
+            return self.snapshots[action]
+        except KeyError:
+            with _write_lock:
+                return self.snapshot(action)
+
+    def get(self, action, default=()):
+        return self[action] if self.entries.get(action) else default
+
+    def keys(self):
+        return list(self.entries)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, action):
+        return bool(self.entries.get(action))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _sweep():
+    while _collected:
+        speaker, action, hook = _collected.popleft()
+        speaker._discard(action, hook)
 
 
 class Speaker(object):
-    def __init__(self, name, actions, output=None):
+    batch_size = 1000
+
+    def __init__(self, name, actions, output=None, parent=None):
         self.name = underlinefy(name)
-        self.actions = OrderedDict()
-        self.hooks = defaultdict(list)
+        self.registry_key = name
+        self._actions = {}
+        # writes are serialized by _write_lock while shouts never take
+        # it, they only read the plans published by _compile
+        self.hooks = HookTable()
+        self.parent = None
+        self._children = weakref.WeakSet()
+        self._identities = self.hooks.entries
+        self._locations = defaultdict(dict)
+        self._plans = {}
+        self._listeners = {}
+        self._undeclared = OrderedDict()
+        self._dispatched = {}
+        self._patterns = PrefixTrie()
+        self._sequence = count()
+        self._stats = {}
+        self.stats_enabled = False
+        self.thread_pool = None
+        self.process_pool = None
+        self.queue = None
+        self._coalescers = {}
+        self._caches = {}
+        self._breakers = {}
+        self.breaker_options = None
+        self.tracer = None
         self.default_exception_handler = Function(self.__base_exc_handler)
         self._exception_handler = self.default_exception_handler
         if not isinstance(actions, list):
             raise TypeError('actions must be a list of strings. Got %r' % actions)
 
-        for action in map(underlinefy, actions):
-            self.actions[action] = nicepartial(self.for_decorator, action)
-            self.actions[action].shout = nicepartial(self.shout, action)
-            self.actions[action].unplug = nicepartial(self.unplug, action)
-            setattr(self, action, self.actions[action])
+        # the Action objects are only built when an action is used, see
+        # __getattr__, declaring thousands of actions costs a name table
+        self._names = OrderedDict.fromkeys(intern_name(underlinefy(action)) for action in actions)
+        reserved = _attributes.get(type(self))
+        if reserved is None:
+            reserved = _attributes.setdefault(type(self), frozenset(dir(type(self))))
+
+        taken = [name for name in self._names if name in reserved or name in self.__dict__]
+        if taken:
+            raise ValueError('{0} cannot be declared as actions of {1}, they are Speaker attributes, '
+                             'use {1}.action(name) to plug and shout them'.format(', '.join(taken), self.name))
 
+        self._plans.update(dict.fromkeys(self._names, _silence))
         SPEAKERS[name] = self
+        if parent is not None:
+            self.set_parent(parent)
+
+    def __getattr__(self, name):
+        names = self.__dict__.get('_names', ())
+        if name not in names:
+            raise AttributeError("'{0}' object has no attribute '{1}'".format(
+                self.__class__.__name__, name))
+
+        action = self.action(name)
+        setattr(self, name, action)
+        return action
+
+    def action(self, name):
+        """returns the :py:class:`Action` of the given action name. Names
+        that are not declared, such as those taken by Speaker attributes
+        like ``flush``, are only reachable this way."""
+        try:
+            return self._actions[name]
+        except KeyError:
+            pass
+
+        action = safe_action_name(name)
+        return self._actions.setdefault(name, self._actions.get(action) or Action(self, action))
+
+    @property
+    def actions(self):
+        return OrderedDict((name, self.action(name)) for name in self._names)
 
     def __str__(self):
         return 'Speaker(name={0}, actions={1}, total_hooks={2})'.format(
@@ -123,6 +666,9 @@ class Speaker(object):
     def __repr__(self):
         return unicode(self)
 
+    def __reduce__(self):
+        return _restore_speaker, (self.registry_key, list(self._names))
+
     def __base_exc_handler(self, speaker, exception, args, kwargs):
         raise
 
@@ -137,53 +683,676 @@ class Speaker(object):
         self._exception_handler = Function(callback)
         return callback
 
-    def for_decorator(self, action, callback):
-        safe_action = underlinefy(action)
-
-        responder = Function(callback)
+    def for_decorator(self, action, callback=None, process=False, batch=False, weak=False, priority=0,
+                      cacheable=False, where=None):
+        if callback is None:
+            return nicepartial(self.for_decorator, action, process=process, batch=batch, weak=weak,
+                               priority=priority, cacheable=cacheable, where=where)
 
-        @wraps(responder.call)
-        def wrapper(*args, **kw):
+        action = safe_action_name(action)
+        where = make_filter(where)
+        if process:
             try:
-                res = callback(self, *args, **kw)
+                pickle.dumps(callback)
             except Exception as exc:
-                if self.exception_handler:
-                    return self._exception_handler(self, exc, args, kw)
-
-            return res
-
-        responder.key = force_bytes('{speaker}:{action}[{module}:{hook}:{lineno}]'.format(
-            speaker=self.name,
-            action=safe_action,
-            module=responder.module_name,
-            hook=wrapper.__name__,
-            lineno=responder.lineno,
-        ))
-        wrapper.callback = callback
-        wrapper.responder = responder
-        self.hooks[action].append(wrapper)
+                raise TypeError('{0} cannot run in a process pool because it is not picklable: {1}'.format(
+                    Function(callback), exc))
+
+        if weak and process:
+            raise TypeError('{0} cannot be both a weak and a process hook'.format(Function(callback)))
+
+        identity = identity_key(callback)
+        location = code_location(callback)
+        with self._writing():
+            existing = self._identities[action].get(identity)
+            if existing is not None:
+                return callback if existing.weak else existing.responder
+
+            if weak:
+                responder = WeakFunction(callback, lambda reference: self._forget(action, hook))
+            else:
+                responder = Function(callback)
+
+            responder.scope = (self.name, action)
+            hook = Hook(self, responder, process=process, batch=batch, weak=weak,
+                        sequence=next(self._sequence), identity=identity, location=location,
+                        priority=priority, cacheable=cacheable, where=where)
+
+            previous = self._locations[action].get(location)
+            if previous is not None and is_reload_of(callback, previous.callback):
+                # same place in the same file but a new code object: the
+                # module was re-imported, the new callback takes the place
+                # of the old one
+                hook.sequence = previous.sequence
+                self._remove(action, previous)
+
+            self._insert(action, hook)
+            self._locations[action][location] = hook
+            self._changed(action)
+
+        if weak:
+            # the responder only holds a weak reference, returning the
+            # callable keeps decorated functions alive
+            return callback
+
         return responder
 
+    @contextmanager
+    def _writing(self):
+        with _write_lock:
+            yield
+            _sweep()
+
+    def _insert(self, action, hook):
+        self._identities[action][hook.identity] = hook
+        self.hooks.changed(action)
+
+    def _remove(self, action, hook):
+        self._identities[action].pop(hook.identity, None)
+        self.hooks.changed(action)
+        self._breakers.pop(hook, None)
+        locations = self._locations[action]
+        if locations.get(hook.location) is hook:
+            del locations[hook.location]
+
+    def _forget(self, action, hook):
+        # called by the garbage collector in whatever thread it runs,
+        # possibly while that thread holds the lock. The hook is only
+        # removed right away when no write is in progress, otherwise
+        # by the end of the current or next write. Its callback is dead
+        # meanwhile, calling it is a no-op.
+        _collected.append((self, action, hook))
+        if _write_lock.acquire(False):
+            try:
+                _sweep()
+            finally:
+                _write_lock.release()
+
+    def _discard(self, action, hook):
+        if self._identities.get(action, {}).get(hook.identity) is hook:
+            self._remove(action, hook)
+            self._changed(action)
+
+    def set_parent(self, parent):
+        """makes ``parent`` the parent of this speaker, or detaches it
+        when ``None``. Shouting an action on a speaker also calls the
+        hooks of the same action on its parent, then on the parent's
+        parent and so on. Hooks of the ancestors get this speaker as
+        their first argument."""
+        with self._writing():
+            ancestor = parent
+            while ancestor is not None:
+                if ancestor is self:
+                    raise ValueError('{0} cannot be an ancestor of itself'.format(self.name))
+
+                ancestor = ancestor.parent
+
+            if self.parent is not None:
+                self.parent._children.discard(self)
+
+            self.parent = parent
+            if parent is not None:
+                parent._children.add(self)
+
+            for action in list(self._plans):
+                self._invalidate(action)
+
+    def _chain(self, action):
+        """returns the flattened ``(hook, callback)`` pairs of the action
+        for a child speaker, compiling it if needed"""
+        try:
+            return self._dispatched[action]
+        except KeyError:
+            self._compile(action)
+            return self._dispatched.get(action, ())
+
+    def subscribe(self, pattern, callback=None, **options):
+        """registers a hook for every action whose name starts with the
+        given pattern, e.g. ``file_*`` or ``file.*``. Actions do not need
+        to be declared upfront to be shouted to pattern subscribers."""
+        if not is_pattern(pattern):
+            raise ValueError('patterns must end with {0!r}, got {1!r}'.format(WILDCARD, pattern))
+
+        return self.for_decorator(pattern, callback, **options)
+
+    def _changed(self, action):
+        if not is_pattern(action):
+            return self._invalidate(action)
+
+        prefix = action[:-1]
+        # the trie holds a live view of the hooks of the pattern
+        self._patterns.set(prefix, self._identities.get(action, {}).values())
+        self._invalidate_prefix(prefix)
+
+    def _invalidate_prefix(self, prefix):
+        for name in list(self._plans):
+            if name.startswith(prefix):
+                self._invalidate(name)
+
+        # children keep plans of names their ancestors never compiled
+        for child in list(self._children) if self._children else ():
+            child._invalidate_prefix(prefix)
+
+    def _invalidate(self, action):
+        """marks the plan of the action as stale, it is compiled again by
+        the next shout or :py:meth:`listeners` call"""
+        self._listeners.pop(action, None)
+        self._dispatched.pop(action, None)
+        if action in self._coalescers or not (self._identities.get(action) or self._patterns or self.parent):
+            # coalescers hold on to their plan and actions without
+            # hooks compile to silence right away
+            return self._compile(action)
+
+        self._plans[action] = _Stale(self, action)
+        for child in list(self._children) if self._children else ():
+            if action in child._plans:
+                child._invalidate(action)
+
+    def _refresh(self, action):
+        with self._writing():
+            plan = self._plans.get(action)
+            if plan is None or isinstance(plan, _Stale):
+                plan = self._compile(action)
+
+            return plan
+
+    def _resolve(self, action):
+        safe_action = safe_action_name(action)
+        plan = self._plans.get(safe_action)
+        if isinstance(plan, _Stale):
+            return self._refresh(safe_action)
+
+        if plan is not None:
+            return plan
+
+        if not self._heard(safe_action):
+            # nothing is stored for names no hook can hear
+            return _silence
+
+        return self._refresh(safe_action)
+
+    def _heard(self, action):
+        """whether the speaker or one of its ancestors has hooks for the
+        given action, directly or through a pattern"""
+        speaker = self
+        while speaker is not None:
+            if speaker._identities.get(action) or speaker._patterns.has_match(action):
+                return True
+
+            speaker = speaker.parent
+
+        return False
+
+    def compile(self, action):
+        """builds the dispatch plan of the given action out of its
+        current hooks. Plans are immutable and only rebuilt when hooks
+        are plugged, unplugged or released, so that :py:meth:`shout`
+        never has to walk through partials or wrappers. Plans are
+        swapped in with a single assignment, shouts in flight keep
+        dispatching to the hooks of the plan they started with."""
+        with self._writing():
+            return self._compile(safe_action_name(action))
+
+    def _compile(self, action):
+        hooks = list(self.hooks.snapshot(action))
+        if self._patterns:
+            hooks.extend(self._patterns.matches(action))
+            hooks.sort(key=lambda hook: hook.order)
+
+        cache = self._caches.get(action)
+        if cache is not None:
+            cache.clear()
+
+        # the hooks of the ancestors come after this speaker's own hooks,
+        # their callbacks are already wrapped by the ancestors
+        parent = self.parent
+        inherited = parent._chain(action) if parent is not None and parent._heard(action) else ()
+        instrumented = self.stats_enabled
+        guarded = self.breaker_options is not None
+        routed = False
+        callbacks = []
+        for hook in hooks:
+            responder = hook.responder
+            if hook.where:
+                routed = True
+            if hook.weak:
+                callback = WeakCallback(responder.reference)
+            else:
+                callback = responder.call
+            if hook.process:
+                callback = InProcessPool(self, callback)
+            if instrumented:
+                callback = Instrumented(callback, self._stats_for(responder.key))
+            if guarded:
+                callback = Guarded(callback, self._breaker_for(hook))
+            if hook.batch:
+                callback = BatchOfOne(callback)
+            elif hook.cacheable:
+                # memoized one by one rather than whole shouts, so that
+                # what the exception handler returns is never cached
+                callback = Memoized(callback, self._cache_for(action), hook.sequence)
+
+            callbacks.append(callback)
+
+        for hook, callback in inherited:
+            routed = routed or bool(hook.where)
+            hooks.append(hook)
+            callbacks.append(callback)
+
+        callbacks = tuple(callbacks)
+        index = RoutingIndex([hook.where for hook in hooks]) if routed else None
+        # hooks of the ancestors keep the exception handler of their speaker
+        owners = tuple(hook.speaker for hook in hooks) if inherited else None
+        plan = _make_plan(self, callbacks, index, owners)
+
+        if self.tracer is not None and callbacks:
+            from .tracing import Spanned, Traced
+
+            traced = _make_plan(self, tuple(
+                Spanned(callback, hook.responder.key) for hook, callback in zip(hooks, callbacks)), index, owners)
+
+            plan = Traced(plan, traced, self.tracer, '{0}:{1}'.format(self.name, action))
+
+        if index is not None:
+            # shouts that do not go through the plan check the filters
+            # of each hook instead of using the index
+            callbacks = tuple(
+                Filtered(callback, hook.where) if hook.where and not isinstance(callback, Filtered) else callback
+                for hook, callback in zip(hooks, callbacks))
+
+        coalescer = self._coalescers.get(action)
+        if coalescer is not None:
+            coalescer.plan = plan
+            plan = coalescer
+
+        if action in self._names or coalescer is not None:
+            self._publish(action, plan, callbacks, hooks)
+        elif callbacks:
+            self._publish(action, plan, callbacks, hooks)
+            self._keep_undeclared(action)
+        else:
+            # undeclared and unheard, shouting it again costs no memory
+            self._drop(action)
+
+        for child in list(self._children):
+            if action in child._plans:
+                child._invalidate(action)
+
+        return plan
+
+    def _publish(self, action, plan, callbacks, hooks):
+        self._listeners[action] = callbacks
+        self._dispatched[action] = tuple(zip(hooks, callbacks))
+        self._plans[action] = plan
+
+    def _keep_undeclared(self, action):
+        undeclared = self._undeclared
+        undeclared[action] = None
+        if len(undeclared) > UNDECLARED_PLANS:
+            oldest, _ = undeclared.popitem(last=False)
+            if oldest not in self._coalescers:
+                self._drop(oldest)
+
+    def _drop(self, action):
+        self._plans.pop(action, None)
+        self._listeners.pop(action, None)
+        self._dispatched.pop(action, None)
+        self._undeclared.pop(action, None)
+        self._caches.pop(action, None)
+
+    def _cache_for(self, action):
+        try:
+            return self._caches[action]
+        except KeyError:
+            return self._caches.setdefault(action, ResultCache())
+
+    def configure_cache(self, action, maxsize=1024, ttl=None):
+        """sets the size and time to live of the result cache shared by
+        the ``cacheable`` hooks of the given action"""
+        self._caches[action] = ResultCache(maxsize=maxsize, ttl=ttl)
+        self.compile(action)
+
+    def cache_info(self, action):
+        """returns the hits, misses, evictions and size of the result
+        cache of the given action"""
+        return self._cache_for(action).info()
+
+    def coalesce(self, action, window, debounce=False, key=None):
+        """collapses redundant shouts of the given action, see
+        :py:class:`speakers.coalescing.Coalescer`. Coalesced shouts
+        return ``None`` right away and are dispatched by a timer once
+        the window is over, or by :py:meth:`flush`. Pass
+        ``window=None`` to only dispatch on :py:meth:`flush`."""
+        from .coalescing import Coalescer
+
+        action = safe_action_name(action)
+        self.uncoalesce(action)
+        self._coalescers[action] = Coalescer(
+            _silence, window, debounce=debounce, key=key,
+            name='{0}:{1}'.format(self.name, action))
+        return self.compile(action)
+
+    def uncoalesce(self, action):
+        """flushes the pending shouts of the action and stops coalescing it"""
+        coalescer = self._coalescers.pop(safe_action_name(action), None)
+        if coalescer is None:
+            return
+
+        self.compile(action)
+        coalescer.flush()
+
+    def flush(self, action=None):
+        """dispatches the shouts held back by :py:meth:`coalesce` right
+        away, for every coalesced action when none is given"""
+        if action is None:
+            return sum(map(self.flush, list(self._coalescers)))
+
+        coalescer = self._coalescers.get(safe_action_name(action))
+        return coalescer.flush() if coalescer is not None else 0
+
+    def compile_all(self):
+        with self._writing():
+            for action in list(self._plans):
+                self._compile(action)
+
+    def _stats_for(self, key):
+        try:
+            return self._stats[key]
+        except KeyError:
+            return self._stats.setdefault(key, HookStats(key))
+
+    def enable_stats(self):
+        """starts recording call counts, exceptions, truthy results and
+        latency histograms of every hook, see :py:meth:`stats`. Hooks
+        are only instrumented while stats are enabled."""
+        self.stats_enabled = True
+        self.compile_all()
+
+    def disable_stats(self):
+        self.stats_enabled = False
+        self.compile_all()
+
+    def reset_stats(self):
+        self._stats.clear()
+        if self.stats_enabled:
+            self.compile_all()
+
+    def stats(self):
+        """returns a snapshot of the recorded stats as a dict keyed by
+        the ``key`` of each hook's responder"""
+        return dict((key, stats.snapshot()) for key, stats in self._stats.items())
+
+    def enable_tracing(self, exporter=None, rate=1.0, maxsize=10000):
+        """samples shouts at the given ``rate`` and exports a span per
+        shout and per hook it called, see
+        :py:class:`speakers.tracing.Tracer`. Spans are kept by a
+        :py:class:`speakers.tracing.MemoryExporter` when no exporter is
+        given. Returns the tracer."""
+        from .tracing import Tracer, MemoryExporter
+
+        self.disable_tracing()
+        self.tracer = Tracer(exporter or MemoryExporter(), rate=rate, maxsize=maxsize)
+        self.compile_all()
+        return self.tracer
+
+    def disable_tracing(self):
+        """stops tracing, the pending spans are exported first"""
+        tracer, self.tracer = self.tracer, None
+        if tracer is not None:
+            self.compile_all()
+            tracer.close()
+
+    def _breaker_for(self, hook):
+        # keyed by hook, closures made by the same factory share the key
+        # of their responder but fail independently
+        try:
+            return self._breakers[hook]
+        except KeyError:
+            return self._breakers.setdefault(hook, CircuitBreaker(hook.responder.key, **self.breaker_options))
+
+    def enable_circuit_breakers(self, failure_rate=0.5, slow_seconds=None, window=20, min_calls=5,
+                                reset_timeout=30.0, on_state_change=None):
+        """gives every hook its own
+        :py:class:`speakers.breaker.CircuitBreaker`: a hook that keeps
+        raising, or taking longer than ``slow_seconds``, is skipped by
+        :py:meth:`shout` until a probe call succeeds again.
+        ``on_state_change(key, old_state, new_state)`` is called when
+        the circuit of a hook opens, goes half-open or closes."""
+        self.breaker_options = dict(
+            failure_rate=failure_rate, slow_seconds=slow_seconds, window=window,
+            min_calls=min_calls, reset_timeout=reset_timeout, on_state_change=on_state_change)
+        self._breakers.clear()
+        self.compile_all()
+
+    def disable_circuit_breakers(self):
+        self.breaker_options = None
+        self._breakers.clear()
+        self.compile_all()
+
+    def breakers(self):
+        """returns the state of the circuit breaker of each hook keyed by
+        the ``key`` of its responder. Hooks sharing a key, such as
+        closures made by the same factory, have a breaker each and the
+        least healthy one is reported."""
+        states = {}
+        for breaker in list(self._breakers.values()):
+            snapshot = breaker.snapshot()
+            current = states.get(breaker.key)
+            if current is None or HEALTH[snapshot['state']] < HEALTH[current['state']]:
+                states[breaker.key] = snapshot
+
+        return states
+
+    def listeners(self, action):
+        """returns the callbacks of the given action in the order they
+        are dispatched"""
+        try:
+            return self._listeners[action]
+        except KeyError:
+            self._resolve(action)
+            return self._listeners.get(safe_action_name(action), ())
+
     def shout(self, action, *args, **kw):
-        for hook in self.hooks[action]:
-            result = hook(*args, **kw)
-            if result:
-                return result
+        try:
+            plan = self._plans[action]
+        except KeyError:
+            plan = self._resolve(action)
+
+        return plan(*args, **kw)
+
+    def dispatch_order(self, action):
+        """returns ``(hook, callback)`` pairs of the given action in the
+        order they are dispatched"""
+        try:
+            return self._dispatched[action]
+        except KeyError:
+            self._resolve(action)
+            return self._dispatched.get(safe_action_name(action), ())
+
+    def shout_within(self, action, timeout, *args, **kw):
+        """shouts the action with a time budget, either in seconds or a
+        shared :py:class:`speakers.deadline.Deadline`. The hooks left
+        once the budget is used up are skipped. Returns a
+        :py:class:`speakers.deadline.ShoutResult` telling which hooks
+        ran, were skipped or timed out."""
+        from .deadline import shout_within
+        return shout_within(self, action, timeout, args, kw)
+
+    def fan_out_within(self, action, timeout, *args, **kw):
+        """:py:meth:`fan_out` with a time budget, hooks that did not
+        start in time are cancelled. See :py:meth:`shout_within`."""
+        from .deadline import fan_out_within
+        return fan_out_within(self, action, timeout, args, kw)
+
+    def shout_many(self, action, iterable_of_args, **kw):
+        """shouts the given action once for each tuple of positional
+        arguments in ``iterable_of_args``, with the same keyword
+        arguments for all of them.
+
+        The iterable is consumed in chunks of :py:attr:`batch_size`
+        items so that generators are never fully materialized. Hooks
+        registered with ``batch=True`` get each chunk as a list of
+        argument tuples in a single call, the other hooks are called
+        once per item. Just like :py:meth:`shout`, the hooks after the
+        first one returning a truthy result for an item do not hear
+        that item, batch hooks only get the items nobody answered yet.
+        What batch hooks return does not stop anything, results are not
+        collected. Returns the number of items shouted.
+        """
+        # the keyword arguments are the same for every item, the filter
+        # of each hook is checked once for the whole shout
+        dispatched = []
+        for hook, callback in self.dispatch_order(action):
+            if hook.where and not matches(hook.where, kw):
+                continue
+
+            while isinstance(callback, Filtered):
+                callback = callback.callback
+
+            dispatched.append((hook, callback))
+
+        iterator = iter(iterable_of_args)
+        total = 0
+        while True:
+            chunk = list(islice(iterator, self.batch_size))
+            if not chunk:
+                return total
+
+            total += len(chunk)
+            for hook, callback in dispatched:
+                if isinstance(callback, BatchOfOne):
+                    _respond(self, callback.callback, (chunk,), kw, hook.speaker)
+                    continue
+
+                unanswered = []
+                for args in chunk:
+                    try:
+                        result = callback(self, *args, **kw)
+                    except Exception as exc:
+                        result = hook.speaker._exception_handler(self, exc, args, kw)
+
+                    if not result:
+                        unanswered.append(args)
+
+                chunk = unanswered
+                if not chunk:
+                    break
+
+    def ashout(self, action, *args, **kw):
+        """awaitable version of :py:meth:`shout`, see :py:func:`speakers.aio.ashout`"""
+        from .aio import ashout
+        return ashout(self, action, *args, **kw)
+
+    def ashout_within(self, action, timeout, *args, **kw):
+        """:py:meth:`ashout` with a time budget, the listeners still
+        pending once it is over are cancelled. See
+        :py:func:`speakers.aio.ashout_within`."""
+        from .aio import ashout_within
+        return ashout_within(self, action, timeout, *args, **kw)
+
+    def use_thread_pool(self, executor=None, max_workers=None):
+        """sets the :py:class:`concurrent.futures.Executor` used by
+        :py:meth:`fan_out`, :py:meth:`gather` and by
+        :py:meth:`ashout` for the sync listeners. A new
+        ``ThreadPoolExecutor`` is created when no executor is given."""
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self.thread_pool = executor
+        return executor
+
+    def use_process_pool(self, executor=None, max_workers=None):
+        """sets the executor used by the hooks registered with
+        ``process=True``. A new ``ProcessPoolExecutor`` is created when
+        no executor is given."""
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+
+        self.process_pool = executor
+        return executor
+
+    def use_queue(self, maxsize=1000, workers=1, overflow='block'):
+        """sets up the :py:class:`speakers.queued.EventQueue` used by
+        :py:meth:`emit_async`. A previous queue is drained and stopped."""
+        from .queued import EventQueue
+
+        if self.queue is not None:
+            self.queue.stop()
+
+        self.queue = EventQueue(self, maxsize=maxsize, workers=workers, overflow=overflow)
+        return self.queue
+
+    def emit_async(self, action, *args, **kw):
+        """enqueues the event and returns right away, the hooks are
+        called by the workers of :py:attr:`queue`. Returns ``False``
+        if the event was dropped because the queue is full."""
+        queue = self.queue or self.use_queue()
+        return queue.put(action, args, kw)
+
+    def _submit(self, action, args, kw):
+        dispatched = self.dispatch_order(action)
+        if not dispatched:
+            return []
+
+        executor = self.thread_pool or self.use_thread_pool()
+        return [executor.submit(_respond, self, callback, args, kw, hook.speaker)
+                for hook, callback in dispatched]
+
+    def fan_out(self, action, *args, **kw):
+        """dispatches the event to all the hooks of the given action at
+        once through :py:attr:`thread_pool`. Returns the same result
+        :py:meth:`shout` would: the first truthy result in hook order,
+        the hooks that did not start yet are cancelled."""
+        futures = self._submit(action, args, kw)
+        try:
+            for future in futures:
+                result = future.result()
+                if result:
+                    return result
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def gather(self, action, *args, **kw):
+        """dispatches the event to all the hooks of the given action at
+        once through :py:attr:`thread_pool` and returns the list of
+        results in hook order"""
+        return [future.result() for future in self._submit(action, args, kw)]
 
     def unplug(self, action, callback):
-        hooks = self.hooks[action]
-        for hook in hooks:
-            if callback.call == hook.callback:
-                hooks.remove(hook)
+        action = safe_action_name(action)
+        target = getattr(callback, 'call', callback)
+        if target is None:
+            return
+
+        with self._writing():
+            hook = self._identities[action].get(identity_key(target))
+            if hook is None:
+                # the module of the callback might have been re-imported
+                # since it was plugged, the new version took its place
+                hook = self._locations[action].get(code_location(target))
+                if hook is None or not is_reload_of(hook.callback, target):
+                    return
+
+            self._remove(action, hook)
+            self._changed(action)
 
     def release(self, action=None):
         if action is None:
-            return list(map(self.release, self.hooks.keys()))
+            return list(map(self.release, list(self.hooks.keys())))
+
+        action = safe_action_name(action)
+        with self._writing():
+            for hook in self._identities.get(action, {}).values():
+                self._breakers.pop(hook, None)
 
-        while self.hooks[action]:
-            self.hooks[action].pop()
+            self.hooks.discard(action)
+            self._locations.pop(action, None)
+            self._changed(action)
 
     @classmethod
     def release_all(cls):
-        for instance in SPEAKERS.values():
+        for instance in list(SPEAKERS.values()):
             instance.release()
@@ -0,0 +1,122 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""bounded result caches for pure listeners, see the ``cacheable``
+argument of :py:meth:`speakers.bus.Speaker.for_decorator`"""
+import threading
+from collections import OrderedDict
+
+from .handy import Wrapper
+from .stats import clock
+
+_missing = object()
+
+
+class ResultCache(object):
+    """thread-safe LRU cache with an optional time to live, in seconds"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1, got {0!r}'.format(maxsize))
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, _missing)
+            if entry is _missing:
+                self.misses += 1
+                return _missing
+
+            expires, value = entry
+            if expires is not None and expires < clock():
+                del self.entries[key]
+                self.misses += 1
+                return _missing
+
+            self.entries.pop(key)
+            self.entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else clock() + self.ttl
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, value)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+
+
+class Memoized(Wrapper):
+    """serves the results of a callback from a :py:class:`ResultCache`,
+    keyed by its arguments. Calls with unhashable arguments go straight
+    to the callback and exceptions are never cached."""
+
+    __slots__ = ('cache', 'tag')
+
+    def __init__(self, callback, cache, tag=None):
+        self.callback = callback
+        self.cache = cache
+        self.tag = tag
+
+    def key_of(self, args, kw):
+        return (self.tag, args, tuple(sorted(kw.items()))) if kw else (self.tag, args)
+
+    def __call__(self, *args, **kw):
+        key = self.key_of(args, kw)
+        try:
+            result = self.cache.get(key)
+        except TypeError:
+            return self.callback(*args, **kw)
+
+        if result is _missing:
+            result = self.callback(*args, **kw)
+            self.cache.set(key, result)
+
+        return result
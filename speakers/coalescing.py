@@ -0,0 +1,94 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""collapses bursts of shouts, see :py:meth:`speakers.bus.Speaker.coalesce`"""
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('speakers')
+
+
+class Coalescer(object):
+    """stands in for the dispatch plan of an action and holds its
+    shouts back for ``window`` seconds.
+
+    Within a window only the last shout is dispatched, or the last
+    shout per key when ``key`` is given: ``key(*args, **kw)`` returns
+    a hashable, shouts with the same key replace each other. The
+    window starts with the first shout, or with every shout when
+    ``debounce`` is true, so that nothing gets dispatched until the
+    action has been quiet for ``window`` seconds.
+    """
+
+    def __init__(self, plan, window, debounce=False, key=None, name='coalescer'):
+        self.plan = plan
+        self.window = window
+        self.debounce = debounce
+        self.key = key
+        self.name = name
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.timer = None
+        self.shouts = 0
+        self.dispatched = 0
+
+    def __call__(self, *args, **kw):
+        key = self.key(*args, **kw) if self.key else None
+        with self.lock:
+            self.shouts += 1
+            self.pending.pop(key, None)
+            self.pending[key] = (args, kw)
+            if self.debounce and self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            if self.timer is None and self.window is not None:
+                self.timer = threading.Timer(self.window, self.expire)
+                self.timer.daemon = True
+                self.timer.name = 'speakers-{0}'.format(self.name)
+                self.timer.start()
+
+    def flush(self):
+        """dispatches the pending shouts right away, in the order their
+        keys were last shouted. Returns how many were dispatched."""
+        with self.lock:
+            pending, self.pending = self.pending, OrderedDict()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        for args, kw in pending.values():
+            self.dispatched += 1
+            self.plan(*args, **kw)
+
+        return len(pending)
+
+    def expire(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('%s failed to flush', self.name)
@@ -0,0 +1,139 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""time budgets for shouts, see :py:meth:`speakers.bus.Speaker.shout_within`"""
+from concurrent.futures import TimeoutError
+
+from .stats import clock
+
+
+class Deadline(object):
+    """a point in time ``seconds`` from now, can be shared by several
+    shouts so that they draw from the same budget"""
+
+    __slots__ = ('expires',)
+
+    def __init__(self, seconds):
+        self.expires = clock() + seconds
+
+    @classmethod
+    def of(cls, timeout):
+        return timeout if isinstance(timeout, cls) else cls(timeout)
+
+    def remaining(self):
+        return max(self.expires - clock(), 0.0)
+
+    @property
+    def expired(self):
+        return clock() >= self.expires
+
+
+class ShoutResult(object):
+    """outcome of a shout with a time budget. ``result`` is what
+    :py:meth:`speakers.bus.Speaker.shout` would have returned, ``ran``,
+    ``skipped`` and ``timed_out`` are lists of
+    :py:class:`speakers.bus.Hook`. Hooks after the one that returned a
+    truthy result are not called and do not show up in any list."""
+
+    __slots__ = ('result', 'ran', 'skipped', 'timed_out')
+
+    def __init__(self):
+        self.result = None
+        self.ran = []
+        self.skipped = []
+        self.timed_out = []
+
+    @property
+    def complete(self):
+        return not (self.skipped or self.timed_out)
+
+    def __repr__(self):
+        return 'ShoutResult(result={0!r}, ran={1}, skipped={2}, timed_out={3})'.format(
+            self.result, len(self.ran), len(self.skipped), len(self.timed_out))
+
+
+def shout_within(speaker, action, timeout, args, kw):
+    """calls the hooks in order while the budget lasts, the hooks left
+    once it is over are skipped. A running hook cannot be interrupted:
+    the one that overran the budget is reported as timed out."""
+    from .bus import _respond
+
+    deadline = Deadline.of(timeout)
+    outcome = ShoutResult()
+    pending = speaker.dispatch_order(action)
+    for index, (hook, callback) in enumerate(pending):
+        if deadline.expired:
+            outcome.skipped.extend(hook for hook, callback in pending[index:])
+            break
+
+        result = _respond(speaker, callback, args, kw, hook.speaker)
+        if deadline.expired:
+            outcome.timed_out.append(hook)
+        else:
+            outcome.ran.append(hook)
+
+        if result:
+            outcome.result = result
+            break
+
+    return outcome
+
+
+def fan_out_within(speaker, action, timeout, args, kw):
+    """dispatches to every hook at once through the speaker's thread
+    pool and waits until the budget is over for the first truthy
+    result in hook order. Hooks that did not start by then are
+    cancelled and reported as skipped, those still running once the
+    budget is over are reported as timed out and their results
+    discarded."""
+    from .bus import _respond
+
+    deadline = Deadline.of(timeout)
+    outcome = ShoutResult()
+    pending = speaker.dispatch_order(action)
+    executor = speaker.thread_pool or speaker.use_thread_pool()
+    futures = [executor.submit(_respond, speaker, callback, args, kw, hook.speaker)
+               for hook, callback in pending]
+    try:
+        for future in futures:
+            try:
+                result = future.result(timeout=deadline.remaining())
+            except TimeoutError:
+                break
+
+            if result:
+                outcome.result = result
+                break
+    finally:
+        for (hook, callback), future in zip(pending, futures):
+            if future.cancel():
+                outcome.skipped.append(hook)
+            elif future.done() or not deadline.expired:
+                outcome.ran.append(hook)
+            else:
+                outcome.timed_out.append(hook)
+
+    return outcome
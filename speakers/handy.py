@@ -25,26 +25,122 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 from six import text_type
 import re
+import sys
 
 
 def slugify(text):
     return re.sub(r'\W', '-', text.strip().lower())
 
 
+def _is_underlinefied(text):
+    # str.isidentifier() is python 3 only
+    try:
+        return text.isidentifier() and text.lower() == text
+    except AttributeError:
+        return False
+
+
 def underlinefy(text):
+    if _is_underlinefied(text):
+        return text
+
     return slugify(text).replace('-', '_')
 
 
+def intern_name(text):
+    """interns the given name when the running python supports it"""
+    try:
+        return sys.intern(text)
+    except (AttributeError, TypeError):
+        return text
+
+
+class Wrapper(object):
+    """base of the callables that dispatch plans wrap around hook
+    callbacks. The wrapped callable is always ``callback``, so that
+    code calling hooks in other ways, such as
+    :py:func:`speakers.aio.ashout`, can look through any of them."""
+
+    __slots__ = ('callback',)
+
+
 class nicepartial(object):
+    __slots__ = ('func', 'args', 'kwargs')
+
     def __init__(self, func, *args, **kw):
         self.func = func
         self.args = args
         self.kwargs = kw
 
     def __call__(self, *args, **kw):
-        new = self.kwargs.copy()
-        new.update(kw)
-        return self.func(*(self.args + args), **new)
+        if self.kwargs:
+            new = self.kwargs.copy()
+            new.update(kw)
+            kw = new
+
+        return self.func(*(self.args + args), **kw)
 
     def __repr__(self):
         return text_type('partial:{0}'.format(self.func.__name__))
+
+
+class PrefixTrie(object):
+    """maps string prefixes to sequences of values. :py:meth:`matches`
+    walks down a given string once and returns the values of all of its
+    prefixes, shortest prefix first."""
+
+    def __init__(self):
+        self.root = {}
+
+    def __bool__(self):
+        return bool(self.root)
+
+    __nonzero__ = __bool__
+
+    def set(self, prefix, value):
+        path = [self.root]
+        for char in prefix:
+            path.append(path[-1].setdefault(char, {}))
+
+        if value:
+            path[-1][None] = value
+            return
+
+        path[-1].pop(None, None)
+        for depth in range(len(prefix), 0, -1):
+            if path[depth]:
+                break
+
+            del path[depth - 1][prefix[depth - 1]]
+
+    def has_match(self, text):
+        """whether any prefix of the given string holds values"""
+        node = self.root
+        if node.get(None):
+            return True
+
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return False
+
+            if node.get(None):
+                return True
+
+        return False
+
+    def matches(self, text):
+        node = self.root
+        found = []
+        if None in node:
+            found.extend(node[None])
+
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+
+            if None in node:
+                found.extend(node[None])
+
+        return found
@@ -0,0 +1,174 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""bounded event queues drained by background workers, see
+:py:meth:`speakers.bus.Speaker.emit_async`"""
+import logging
+import threading
+from collections import deque
+
+from six.moves.queue import Full
+
+from .stats import clock
+
+logger = logging.getLogger('speakers')
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+RAISE = 'raise'
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, RAISE)
+
+
+class EventQueue(object):
+    """holds at most ``maxsize`` shouts of a speaker, ``workers``
+    daemon threads take them out in order and dispatch them with
+    :py:meth:`speakers.bus.Speaker.shout`.
+
+    When the queue is full ``overflow`` decides what :py:meth:`put`
+    does: ``block`` until there is room, ``drop-oldest`` discards the
+    oldest pending event, ``drop-newest`` discards the new one and
+    ``raise`` raises :py:class:`queue.Full`.
+    """
+
+    def __init__(self, speaker, maxsize=1000, workers=1, overflow=BLOCK):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {0}, got {1!r}'.format(
+                ', '.join(OVERFLOW_POLICIES), overflow))
+
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1, got {0!r}'.format(maxsize))
+
+        self.speaker = speaker
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.events = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.unfinished = 0
+        self.processed = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.threads = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self.work, name='speakers-{0}-{1}'.format(speaker.name, index))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, action, args, kw):
+        """enqueues a shout, returns ``False`` if it was dropped"""
+        with self.condition:
+            if not self.running:
+                raise RuntimeError('{0} is stopped'.format(self))
+
+            if len(self.events) >= self.maxsize:
+                if self.overflow == RAISE:
+                    raise Full('{0} is full'.format(self))
+
+                if self.overflow == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+
+                if self.overflow == DROP_OLDEST:
+                    self.events.popleft()
+                    self.unfinished -= 1
+                    self.dropped += 1
+
+                while len(self.events) >= self.maxsize:
+                    self.condition.wait()
+
+            self.events.append((clock(), action, args, kw))
+            self.unfinished += 1
+            self.condition.notify_all()
+            return True
+
+    def work(self):
+        while True:
+            with self.condition:
+                while self.running and not self.events:
+                    self.condition.wait()
+
+                if not self.events:
+                    return
+
+                enqueued, action, args, kw = self.events.popleft()
+                self.condition.notify_all()
+
+            self.last_lag = clock() - enqueued
+            try:
+                self.speaker.shout(action, *args, **kw)
+            except Exception:
+                logger.exception('%s failed to dispatch %s', self, action)
+            finally:
+                with self.condition:
+                    self.unfinished -= 1
+                    self.processed += 1
+                    self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """waits until every enqueued event is dispatched, returns
+        ``False`` if the timeout expired first"""
+        deadline = None if timeout is None else clock() + timeout
+        with self.condition:
+            while self.unfinished:
+                remaining = None if deadline is None else deadline - clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self.condition.wait(remaining)
+
+        return True
+
+    def stop(self, wait=True):
+        """stops accepting events, workers exit once the queue is drained"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def metrics(self):
+        """returns the queue depth, the age in seconds of the oldest
+        pending event (``lag``), how long the last dispatched event
+        waited (``last_lag``) and the processed and dropped counters"""
+        with self.condition:
+            oldest = self.events[0][0] if self.events else None
+            return {
+                'depth': len(self.events),
+                'maxsize': self.maxsize,
+                'lag': 0.0 if oldest is None else clock() - oldest,
+                'last_lag': self.last_lag,
+                'processed': self.processed,
+                'dropped': self.dropped,
+            }
+
+    def __repr__(self):
+        return 'EventQueue(speaker={0}, maxsize={1}, overflow={2})'.format(
+            self.speaker.name, self.maxsize, self.overflow)
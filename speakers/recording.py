@@ -0,0 +1,180 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""records the shouts of speakers into an append-only log and replays
+them, e.g. to benchmark new listeners against production traffic.
+
+Each record is a header made of the time of the shout, as a big-endian
+double, and the 4 bytes big-endian length of the payload, followed by
+the payload: the ``(speaker name, action, args, kw)`` tuple dumped by
+the serializer. Any object with ``dumps`` and ``loads`` functions
+working with bytes can be used as serializer, :py:mod:`pickle` is the
+default, so only replay logs that you trust.
+"""
+import io
+import logging
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+
+from .bus import SPEAKERS
+
+logger = logging.getLogger('speakers')
+HEADER = struct.Struct('!dI')
+#: recording hooks run before every other hook, so that hooks returning
+#: a truthy result do not keep shouts out of the log
+RECORD_PRIORITY = sys.maxsize
+
+
+class EventRecorder(object):
+    """appends the shouts of the recorded actions to the log at ``path``
+    through a write buffer of ``buffer_size`` bytes. Shouts that cannot
+    be serialized are logged and counted in :py:attr:`failed`."""
+
+    def __init__(self, path, serializer=pickle, buffer_size=64 * 1024):
+        self.path = path
+        self.serializer = serializer
+        self.stream = io.open(path, 'ab', buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.recorded = []
+        self.count = 0
+        self.failed = 0
+
+    def record(self, speaker, actions):
+        """plugs a recording hook into each of the given actions of the speaker"""
+        for action in actions:
+            hook = self.hook_for(speaker.registry_key, action)
+            speaker.for_decorator(action, hook, priority=RECORD_PRIORITY)
+            self.recorded.append((speaker, action, hook))
+
+        return self
+
+    def hook_for(self, name, action):
+        def record(event, *args, **kw):
+            try:
+                self.write(name, action, args, kw)
+            except Exception:
+                # the shout goes on, only the log misses it
+                self.failed += 1
+                logger.exception('failed to record %s of %s', action, name)
+
+        return record
+
+    def write(self, name, action, args, kw):
+        payload = self.serializer.dumps((name, action, args, kw))
+        with self.lock:
+            self.stream.write(HEADER.pack(time.time(), len(payload)) + payload)
+            self.count += 1
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+    def close(self):
+        """unplugs the recording hooks and closes the log"""
+        for speaker, action, hook in self.recorded:
+            speaker.unplug(action, hook)
+
+        del self.recorded[:]
+        with self.lock:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_records(buffer):
+    """yields the ``(timestamp, payload)`` of each record in the buffer,
+    a truncated record at the end of the log is ignored"""
+    offset = 0
+    size = len(buffer)
+    while offset + HEADER.size <= size:
+        timestamp, length = HEADER.unpack_from(buffer, offset)
+        offset += HEADER.size
+        if offset + length > size:
+            return
+
+        yield timestamp, buffer[offset:offset + length]
+        offset += length
+
+
+class EventReplayer(object):
+    """shouts the events of a log recorded by :py:class:`EventRecorder`
+    into the speakers returned by ``resolve``, by default the global
+    registry of speakers. Events of unknown speakers are skipped."""
+
+    def __init__(self, path, serializer=pickle, resolve=None):
+        self.path = path
+        self.serializer = serializer
+        self.resolve = resolve or SPEAKERS.get
+
+    def events(self):
+        """yields the ``(timestamp, name, action, args, kw)`` of every recorded shout"""
+        with io.open(self.path, 'rb') as stream:
+            if not os.fstat(stream.fileno()).st_size:
+                return
+
+            buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for timestamp, payload in read_records(buffer):
+                    name, action, args, kw = self.serializer.loads(payload)
+                    yield timestamp, name, action, args, kw
+            finally:
+                buffer.close()
+
+    def replay(self, speed=1.0):
+        """shouts the recorded events in order. ``speed`` scales the
+        original pace, ``2`` replays twice as fast, and ``None`` replays
+        as fast as possible. Returns the number of shouted events."""
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be positive or None, got {0!r}'.format(speed))
+
+        shouted = 0
+        first = started = None
+        for timestamp, name, action, args, kw in self.events():
+            if speed is not None:
+                if first is None:
+                    first, started = timestamp, time.time()
+
+                delay = started + (timestamp - first) / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            speaker = self.resolve(name)
+            if speaker is None:
+                continue
+
+            speaker.shout(action, *args, **kw)
+            shouted += 1
+
+        return shouted
@@ -0,0 +1,331 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""shared memory ring buffer transport for high event rates between
+processes on the same host, requires python 3.8+.
+
+A single :py:class:`RingProducer` writes the events of the forwarded
+actions into fixed-size slots of a ``multiprocessing.shared_memory``
+segment, any number of :py:class:`RingConsumer` read every event and
+shout it into their local speaker of the same name.
+
+Each slot holds an entry header (sequence, kind, label and payload
+lengths), the ``speaker\\0action`` label and the payload. When the only
+argument of a shout supports the buffer protocol (``bytes``,
+``bytearray``, ``memoryview``, ``array.array``...) its bytes are copied
+straight into the slot and consumers hand their listeners a
+``memoryview`` of the shared memory, without any further copy. That
+view must not be kept once the listeners returned, and the producer
+may overwrite it while they run when it wraps around the ring: such
+events are counted in :py:attr:`RingConsumer.torn`, consumers created
+with ``copy=True`` never see them. Other events are pickled.
+
+Consumers that fall more than ``slots`` events behind lose the
+overwritten events, see :py:attr:`RingConsumer.lost`. Events that do
+not fit in a slot are not forwarded, see :py:attr:`RingProducer.dropped`.
+"""
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from .bridge import FORWARD_PRIORITY, is_relaying, relay
+from .bus import SPEAKERS
+
+logger = logging.getLogger('speakers')
+
+#: write sequence, number of slots, slot size and pid of the creator
+HEADER = struct.Struct('!QQQQ')
+#: sequence, kind, label length and payload length
+ENTRY = struct.Struct('!QBHI')
+SEQUENCE = struct.Struct('!Q')
+
+PICKLED = 0
+BUFFER = 1
+
+
+def _buffer_of(value):
+    try:
+        return memoryview(value).cast('B')
+    except TypeError:
+        return None
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # python < 3.13 always registers the segment with the resource
+    # tracker, which unlinks it when the tracker exits. Processes that
+    # share the tracker of the producer (forked children) are fine,
+    # a tracker started just for this segment must forget about it.
+    tracker_was_running = getattr(resource_tracker._resource_tracker, '_fd', None) is not None
+    memory = shared_memory.SharedMemory(name=name)
+    if not tracker_was_running:
+        resource_tracker.unregister(memory._name, 'shared_memory')
+
+    return memory
+
+
+class RingBuffer(object):
+    """the shared memory segment, its header and its slots"""
+
+    def __init__(self, name=None, slots=1024, slot_size=4096, create=False):
+        if create:
+            self.memory = shared_memory.SharedMemory(
+                name=name, create=True, size=HEADER.size + slots * slot_size)
+            HEADER.pack_into(self.memory.buf, 0, 0, slots, slot_size, os.getpid())
+        else:
+            self.memory = _attach(name)
+            _, slots, slot_size, _ = HEADER.unpack_from(self.memory.buf, 0)
+
+        self.slots = slots
+        self.slot_size = slot_size
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def write_sequence(self):
+        return SEQUENCE.unpack_from(self.memory.buf, 0)[0]
+
+    @write_sequence.setter
+    def write_sequence(self, sequence):
+        SEQUENCE.pack_into(self.memory.buf, 0, sequence)
+
+    def offset(self, sequence):
+        return HEADER.size + (sequence % self.slots) * self.slot_size
+
+    def close(self):
+        self.memory.close()
+
+
+class RingProducer(object):
+    """creates the ring buffer and writes the shouts of the forwarded
+    actions into it. There must be a single producer per ring, it can
+    be shared by the threads of its process."""
+
+    def __init__(self, name=None, slots=1024, slot_size=4096, protocol=pickle.HIGHEST_PROTOCOL):
+        self.ring = RingBuffer(name, slots=slots, slot_size=slot_size, create=True)
+        self.protocol = protocol
+        self.lock = threading.Lock()
+        self.forwarded = []
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def name(self):
+        return self.ring.name
+
+    def forward(self, speaker, actions):
+        """plugs a forwarding hook into each of the given actions of the speaker"""
+        for action in actions:
+            hook = self.hook_for(speaker.registry_key, action)
+            speaker.for_decorator(action, hook, priority=FORWARD_PRIORITY)
+            self.forwarded.append((speaker, action, hook))
+
+    def hook_for(self, name, action):
+        def forward(event, *args, **kw):
+            if is_relaying():
+                return
+
+            try:
+                self.write(name, action, args, kw)
+            except Exception:
+                # the local shout goes on, only the consumers miss the event
+                self.failed += 1
+                logger.exception('failed to write %s of %s into the ring', action, name)
+
+        return forward
+
+    def write(self, name, action, args, kw):
+        """writes an event into the next slot, returns ``False`` if it
+        was dropped because it does not fit in a slot"""
+        payload = _buffer_of(args[0]) if len(args) == 1 and not kw else None
+        kind = BUFFER
+        if payload is None:
+            kind = PICKLED
+            payload = pickle.dumps((args, kw), self.protocol)
+
+        label = '{0}\0{1}'.format(name, action).encode('utf-8')
+        size = ENTRY.size + len(label) + len(payload)
+        if size > self.ring.slot_size:
+            self.dropped += 1
+            logger.warning('dropped %s event of %d bytes, it does not fit in slots of %d bytes',
+                           action, size, self.ring.slot_size)
+            return False
+
+        buf = self.ring.memory.buf
+        with self.lock:
+            sequence = self.ring.write_sequence + 1
+            offset = self.ring.offset(sequence)
+            # readers treat a slot whose sequence does not match as overwritten
+            SEQUENCE.pack_into(buf, offset, 0)
+            start = offset + ENTRY.size
+            buf[start:start + len(label)] = label
+            start += len(label)
+            buf[start:start + len(payload)] = payload
+            ENTRY.pack_into(buf, offset, sequence, kind, len(label), len(payload))
+            self.ring.write_sequence = sequence
+
+        return True
+
+    def close(self, unlink=True):
+        """unplugs the forwarding hooks and releases the shared memory"""
+        for speaker, action, hook in self.forwarded:
+            speaker.unplug(action, hook)
+
+        del self.forwarded[:]
+        memory = self.ring.memory
+        self.ring.close()
+        if unlink:
+            memory.unlink()
+
+
+class RingConsumer(object):
+    """reads the events written after it attached to the ring and
+    shouts them into the local speakers. ``resolve`` maps a speaker
+    name to a local speaker, by default the global registry.
+
+    Events that cannot be decoded, e.g. because of a class this process
+    does not have, are logged and counted in :py:attr:`failed`.
+
+    Call :py:meth:`poll` from your own loop, or :py:meth:`start` a
+    thread that polls with an exponential backoff of up to
+    ``max_sleep`` seconds while the ring is idle. With ``copy=True``
+    buffer payloads are handed to listeners as ``bytes`` instead of a
+    view of the shared memory.
+    """
+
+    def __init__(self, name, resolve=None, copy=False, max_sleep=0.001):
+        self.ring = RingBuffer(name)
+        self.resolve = resolve or SPEAKERS.get
+        self.copy = copy
+        self.max_sleep = max_sleep
+        self.next_sequence = self.ring.write_sequence + 1
+        self.received = 0
+        self.lost = 0
+        self.torn = 0
+        self.failed = 0
+        self.running = False
+        self.thread = None
+
+    def poll(self):
+        """dispatches every event available, returns how many"""
+        head = self.ring.write_sequence
+        oldest = head - self.ring.slots + 1
+        if self.next_sequence < oldest:
+            self.lost += oldest - self.next_sequence
+            self.next_sequence = oldest
+
+        dispatched = 0
+        while self.next_sequence <= head:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            if self.read(sequence):
+                dispatched += 1
+
+        return dispatched
+
+    def read(self, sequence):
+        buf = self.ring.memory.buf
+        offset = self.ring.offset(sequence)
+        written, kind, label_size, payload_size = ENTRY.unpack_from(buf, offset)
+        if written != sequence:
+            self.lost += 1
+            return False
+
+        start = offset + ENTRY.size
+        label = bytes(buf[start:start + label_size])
+        start += label_size
+        view = buf[start:start + payload_size]
+        try:
+            if kind == PICKLED or self.copy:
+                data = bytes(view)
+
+            if SEQUENCE.unpack_from(buf, offset)[0] != sequence:
+                self.lost += 1
+                return False
+
+            try:
+                name, action = label.decode('utf-8').split('\0', 1)
+                if kind == PICKLED:
+                    args, kw = pickle.loads(data)
+                else:
+                    args, kw = (data if self.copy else view,), {}
+            except Exception:
+                # e.g. a class this process does not know, the next
+                # events can still be read
+                self.failed += 1
+                logger.exception('failed to decode event %d of ring %s', sequence, self.ring.name)
+                return False
+
+            speaker = self.resolve(name)
+            self.received += 1
+            if speaker is not None:
+                relay(speaker, action, args, kw)
+
+            if kind == BUFFER and not self.copy and SEQUENCE.unpack_from(buf, offset)[0] != sequence:
+                # the producer wrapped around while the listeners were
+                # reading the view, they might have seen the next event
+                self.torn += 1
+
+            return True
+        finally:
+            view.release()
+
+    def run(self):
+        sleep = 0
+        while self.running:
+            if self.poll():
+                sleep = 0
+                continue
+
+            sleep = min(max(sleep * 2, 0.00001), self.max_sleep)
+            time.sleep(sleep)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='speakers-ring-consumer')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        self.ring.close()
@@ -0,0 +1,113 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""content based routing of shouts, see the ``where`` argument of
+:py:meth:`speakers.bus.Speaker.for_decorator`"""
+from itertools import chain
+
+from .handy import Wrapper
+
+_missing = object()
+
+
+def make_filter(where):
+    """validates the ``{argument: value}`` equality filter of a hook and
+    returns it as a sorted tuple of items"""
+    if not where:
+        return ()
+
+    if not isinstance(where, dict):
+        raise TypeError('filters must be a dict of keyword argument values, got {0!r}'.format(where))
+
+    items = tuple(sorted(where.items()))
+    try:
+        hash(items)
+    except TypeError:
+        raise TypeError('filter values must be hashable, got {0!r}'.format(where))
+
+    return items
+
+
+def matches(where, kw):
+    for name, value in where:
+        if kw.get(name, _missing) != value:
+            return False
+
+    return True
+
+
+class Filtered(Wrapper):
+    """only calls a hook callback when the keyword arguments of the
+    shout match its filter, used where shouts do not go through a
+    :py:class:`RoutingIndex`"""
+
+    __slots__ = ('where',)
+
+    def __init__(self, callback, where):
+        self.callback = callback
+        self.where = where
+
+    def __call__(self, speaker, *args, **kw):
+        if matches(self.where, kw):
+            return self.callback(speaker, *args, **kw)
+
+
+class RoutingIndex(object):
+    """maps the filter values of the hooks of an action to their
+    positions in dispatch order. Hooks filtering on the same arguments
+    share a hash table, so that finding the hooks of a shout costs a
+    lookup per distinct set of filtered arguments instead of a call
+    per hook. Hooks without filter always match."""
+
+    __slots__ = ('always', 'tables')
+
+    def __init__(self, filters):
+        self.always = [position for position, where in enumerate(filters) if not where]
+        tables = {}
+        for position, where in enumerate(filters):
+            if where:
+                names = tuple(name for name, value in where)
+                values = tuple(value for name, value in where)
+                tables.setdefault(names, {}).setdefault(values, []).append(position)
+
+        self.tables = tuple(tables.items())
+
+    def match(self, kw):
+        """returns the positions of the hooks matching the keyword arguments, in order"""
+        found = [self.always] if self.always else []
+        for names, table in self.tables:
+            try:
+                positions = table.get(tuple(kw.get(name, _missing) for name in names))
+            except TypeError:
+                continue
+
+            if positions:
+                found.append(positions)
+
+        if len(found) == 1:
+            return found[0]
+
+        return sorted(chain.from_iterable(found))
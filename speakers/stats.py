@@ -0,0 +1,107 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""per-hook instrumentation, see :py:meth:`speakers.bus.Speaker.enable_stats`"""
+import time
+
+from .handy import Wrapper
+
+clock = getattr(time, 'perf_counter', time.time)
+
+#: latency buckets are powers of two in microseconds, the last one
+#: holds everything slower than ~8 seconds
+HISTOGRAM_SIZE = 24
+
+
+class HookStats(object):
+    """fixed-size counters and latency histogram of a single hook.
+    Updates are not locked, counters may be slightly off when the
+    same hook is called from many threads at once."""
+
+    __slots__ = ('key', 'calls', 'exceptions', 'truthy', 'total_seconds',
+                 'slowest_seconds', 'histogram')
+
+    def __init__(self, key):
+        self.key = key
+        self.calls = 0
+        self.exceptions = 0
+        self.truthy = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.histogram = [0] * HISTOGRAM_SIZE
+
+    def record(self, elapsed, result=None, failed=False):
+        self.calls += 1
+        if failed:
+            self.exceptions += 1
+        elif result:
+            self.truthy += 1
+
+        self.total_seconds += elapsed
+        if elapsed > self.slowest_seconds:
+            self.slowest_seconds = elapsed
+
+        bucket = int(elapsed * 1000000).bit_length()
+        self.histogram[min(bucket, HISTOGRAM_SIZE - 1)] += 1
+
+    def snapshot(self):
+        """returns a dict with the current counters. The histogram is a
+        list of ``(upper_bound_seconds, count)`` tuples for the buckets
+        that were hit"""
+        last = HISTOGRAM_SIZE - 1
+        return {
+            'key': self.key,
+            'calls': self.calls,
+            'exceptions': self.exceptions,
+            'truthy': self.truthy,
+            'total_seconds': self.total_seconds,
+            'slowest_seconds': self.slowest_seconds,
+            'histogram': [
+                (float('inf') if bucket == last else (2 ** bucket) / 1000000.0, hits)
+                for bucket, hits in enumerate(self.histogram) if hits
+            ],
+        }
+
+
+class Instrumented(Wrapper):
+    """wraps a hook callback and records its calls into a :py:class:`HookStats`"""
+
+    __slots__ = ('stats',)
+
+    def __init__(self, callback, stats):
+        self.callback = callback
+        self.stats = stats
+
+    def __call__(self, *args, **kw):
+        started = clock()
+        try:
+            result = self.callback(*args, **kw)
+        except Exception:
+            self.stats.record(clock() - started, failed=True)
+            raise
+
+        self.stats.record(clock() - started, result)
+        return result
@@ -0,0 +1,269 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""sampled tracing of shouts, see :py:meth:`speakers.bus.Speaker.enable_tracing`"""
+import io
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from .handy import Wrapper
+from .stats import clock
+
+logger = logging.getLogger('speakers')
+
+OK = 'ok'
+ERROR = 'error'
+
+_local = threading.local()
+
+
+def _new_id():
+    return random.getrandbits(64)
+
+
+class Span(object):
+    """a shout, or a hook called by a shout when ``parent_id`` is set.
+    ``stopped`` tells whether a hook returned a truthy result, which
+    ends the dispatch of the shout"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start', 'duration',
+                 'outcome', 'stopped')
+
+    def __init__(self, trace_id, span_id, parent_id, name, start, duration, outcome, stopped=False):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.outcome = outcome
+        self.stopped = stopped
+
+    def as_line(self):
+        """``trace span parent start duration_us outcome stopped name``,
+        ids are hexadecimal and the parent of a shout span is ``-``"""
+        return '{0:016x} {1:016x} {2} {3:.6f} {4:.1f} {5} {6:d} {7}'.format(
+            self.trace_id, self.span_id,
+            '-' if self.parent_id is None else '{0:016x}'.format(self.parent_id),
+            self.start, self.duration * 1000000, self.outcome, self.stopped, self.name)
+
+    def __repr__(self):
+        return 'Span({0})'.format(self.as_line())
+
+
+class Trace(object):
+    """collects the hook spans of a single shout"""
+
+    __slots__ = ('trace_id', 'span_id', 'started', 'wall', 'spans')
+
+    def __init__(self):
+        self.trace_id = _new_id()
+        self.span_id = _new_id()
+        self.started = clock()
+        self.wall = time.time()
+        self.spans = []
+
+    def child(self, name, started, duration, outcome, stopped):
+        self.spans.append(Span(self.trace_id, _new_id(), self.span_id, name,
+                               self.wall + started - self.started, duration, outcome, stopped))
+
+    def finish(self, name, outcome):
+        root = Span(self.trace_id, self.span_id, None, name, self.wall,
+                    clock() - self.started, outcome)
+        return [root] + self.spans
+
+
+class Spanned(Wrapper):
+    """records a child span for each call of a hook callback made by a
+    sampled shout"""
+
+    __slots__ = ('key',)
+
+    def __init__(self, callback, key):
+        self.callback = callback
+        self.key = key
+
+    def __call__(self, *args, **kw):
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            return self.callback(*args, **kw)
+
+        started = clock()
+        outcome = ERROR
+        result = None
+        try:
+            result = self.callback(*args, **kw)
+            outcome = OK
+            return result
+        finally:
+            trace.child(self.key, started, clock() - started, outcome, bool(result))
+
+
+class Traced(object):
+    """dispatch plan that runs ``traced``, the plan made of
+    :py:class:`Spanned` hooks, for the sampled shouts and ``plan``
+    for the others"""
+
+    __slots__ = ('plan', 'traced', 'tracer', 'name')
+
+    def __init__(self, plan, traced, tracer, name):
+        self.plan = plan
+        self.traced = traced
+        self.tracer = tracer
+        self.name = name
+
+    def __call__(self, *args, **kw):
+        tracer = self.tracer
+        if tracer.rate < 1 and random.random() >= tracer.rate:
+            return self.plan(*args, **kw)
+
+        previous = getattr(_local, 'trace', None)
+        trace = _local.trace = Trace()
+        outcome = ERROR
+        try:
+            result = self.traced(*args, **kw)
+            outcome = OK
+            return result
+        finally:
+            _local.trace = previous
+            tracer.export(trace.finish(self.name, outcome))
+
+
+class MemoryExporter(object):
+    """keeps the exported spans in :py:attr:`spans`"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def lines(self):
+        return [span.as_line() for span in self.spans]
+
+    def close(self):
+        pass
+
+
+class FileExporter(object):
+    """appends one :py:meth:`Span.as_line` per span to the given file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.stream = io.open(path, 'a', encoding='utf-8')
+
+    def export(self, spans):
+        self.stream.write(''.join(span.as_line() + '\n' for span in spans))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+class Tracer(object):
+    """samples shouts at the given ``rate``, between 0 and 1, and hands
+    their spans to ``exporter`` from a daemon thread. At most
+    ``maxsize`` spans wait for the exporter, the spans of new traces
+    are dropped when it cannot keep up."""
+
+    def __init__(self, exporter, rate=1.0, maxsize=10000, batch_size=256):
+        if not 0 <= rate <= 1:
+            raise ValueError('rate must be within [0, 1], got {0!r}'.format(rate))
+
+        self.exporter = exporter
+        self.rate = rate
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.exporting = 0
+        self.exported = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.work, name='speakers-tracer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def export(self, spans):
+        with self.condition:
+            if not self.running or len(self.pending) + len(spans) > self.maxsize:
+                self.dropped += len(spans)
+                return
+
+            self.pending.extend(spans)
+            self.condition.notify_all()
+
+    def work(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+
+                if not self.pending:
+                    return
+
+                count = min(len(self.pending), self.batch_size)
+                batch = [self.pending.popleft() for index in range(count)]
+                self.exporting = count
+
+            try:
+                self.exporter.export(batch)
+            except Exception:
+                logger.exception('%s failed to export %d spans', self, count)
+            finally:
+                with self.condition:
+                    self.exporting = 0
+                    self.exported += count
+                    self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """waits until the pending spans are exported, returns ``False``
+        if the timeout expired first"""
+        deadline = None if timeout is None else clock() + timeout
+        with self.condition:
+            while self.pending or self.exporting:
+                remaining = None if deadline is None else deadline - clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self.condition.wait(remaining)
+
+        return True
+
+    def close(self):
+        """exports the pending spans and closes the exporter"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        self.thread.join()
+        self.exporter.close()
+
+    def __repr__(self):
+        return 'Tracer(exporter={0}, rate={1})'.format(self.exporter.__class__.__name__, self.rate)
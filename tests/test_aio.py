@@ -0,0 +1,306 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import asyncio
+import time
+
+from speakers.bus import Speaker
+from speakers.breaker import OPEN
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_ashout_awaits_coroutine_listeners_concurrently():
+    "Speaker#ashout awaits async listeners at the same time"
+
+    on = Speaker('on', ['ready'])
+    started = []
+
+    @on.ready
+    async def slow(event, value):
+        started.append('slow')
+        await asyncio.sleep(0.2)
+        return 'slow'
+
+    @on.ready
+    async def fast(event, value):
+        started.append('fast')
+        await asyncio.sleep(0.01)
+        return value
+
+    run(on.ashout('ready', 'fast')).should.equal('fast')
+    started.should.equal(['slow', 'fast'])
+
+
+def test_ashout_cancels_pending_listeners():
+    "Speaker#ashout cancels the remaining listeners once one answers"
+
+    on = Speaker('on', ['ready'])
+    cancelled = []
+
+    @on.ready
+    async def never_finishes(event):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    @on.ready
+    async def answers(event):
+        return 42
+
+    started = time.time()
+    run(on.ready.ashout()).should.equal(42)
+    (time.time() - started).should.be.lower_than(5)
+    cancelled.should.equal([True])
+
+
+def test_ashout_runs_sync_listeners_in_executor():
+    "Speaker#ashout runs sync listeners in the default executor"
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    def sync_listener(event, value):
+        return value * 2
+
+    run(on.ashout('ready', 21)).should.equal(42)
+
+
+def test_ashout_falsy_results():
+    "Speaker#ashout returns None when no listener answers"
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    async def quiet(event):
+        return None
+
+    run(on.ashout('ready')).should.be.none
+    run(on.ashout('unknown')).should.be.none
+
+
+def test_ashout_exception_handler():
+    "Speaker#ashout sends exceptions to the exception handler"
+
+    on = Speaker('on', ['ready'])
+    errors = []
+
+    @on.exception_handler
+    def handler(speaker, exception, args, kwargs):
+        errors.append((exception, args, kwargs))
+
+    @on.ready
+    async def broken(event, *args, **kwargs):
+        raise IOError("You got served")
+
+    run(on.ashout('ready', 'YAY', awesome=True)).should.be.none
+    errors.should.have.length_of(1)
+    errors[0][0].should.be.an(IOError)
+    errors[0][1].should.equal(('YAY',))
+    errors[0][2].should.equal({'awesome': True})
+
+
+def test_ashout_raises_by_default():
+    "Speaker#ashout raises listener exceptions by default"
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    async def broken(event):
+        raise IOError("You got served")
+
+    run.when.called_with(on.ashout('ready')).should.throw(IOError, "You got served")
+
+
+def test_ashout_records_stats_of_coroutine_listeners():
+    "Speaker#ashout records stats of coroutine listeners"
+
+    on = Speaker('on', ['ready'])
+    on.enable_stats()
+
+    @on.ready
+    async def answer(event):
+        return 42
+
+    run(on.ashout('ready')).should.equal(42)
+    stats = on.stats()[answer.key]
+    stats['calls'].should.equal(1)
+    stats['truthy'].should.equal(1)
+
+
+def test_ashout_awaits_weak_coroutine_listeners():
+    "Speaker#ashout awaits async listeners registered with weak=True"
+
+    on = Speaker('on', ['ready'])
+    on.enable_stats()
+
+    async def answer(event, value):
+        await asyncio.sleep(0)
+        return value
+
+    on.for_decorator('ready', answer, weak=True)
+
+    run(on.ashout('ready', 42)).should.equal(42)
+    on.stats()[on.hooks['ready'][0].responder.key]['truthy'].should.equal(1)
+
+
+def test_ashout_caches_the_awaited_results_of_cacheable_async_listeners():
+    "Speaker#ashout awaits cacheable async listeners and caches their results"
+
+    on = Speaker('on', ['lookup'])
+    calls = []
+
+    async def lookup(event, key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return key.upper()
+
+    on.for_decorator('lookup', lookup, cacheable=True)
+    on.for_decorator('lookup', lambda event, key: None)
+
+    run(on.ashout('lookup', 'user')).should.equal('USER')
+    run(on.ashout('lookup', 'user')).should.equal('USER')
+    calls.should.equal(['user'])
+    on.cache_info('lookup')['hits'].should.equal(1)
+
+
+def test_ashout_awaits_async_listeners_behind_circuit_breakers():
+    "Speaker#ashout awaits async listeners and records their failures in their circuit breaker"
+
+    on = Speaker('on', ['ready'])
+    on.enable_circuit_breakers(min_calls=2, window=2, reset_timeout=60)
+    on.exception_handler(lambda speaker, exception, args, kwargs: None)
+
+    @on.ready
+    async def broken(event):
+        await asyncio.sleep(0)
+        raise ValueError('boom')
+
+    for attempt in range(3):
+        run(on.ashout('ready')).should.be.none
+
+    on.breakers()[broken.key]['state'].should.equal(OPEN)
+    on.breakers()[broken.key]['skipped'].should.equal(1)
+
+
+def test_cancelled_probes_give_the_half_open_circuit_back():
+    "A half-open probe cancelled by Speaker#ashout does not keep the hook skipped"
+
+    on = Speaker('on', ['ready'])
+    on.enable_circuit_breakers(min_calls=1, window=1, reset_timeout=0)
+    on.exception_handler(lambda speaker, exception, args, kwargs: None)
+    probes = []
+
+    @on.ready
+    async def flaky(event):
+        probes.append(len(probes))
+        if len(probes) == 1:
+            raise ValueError('boom')
+
+        await asyncio.sleep(10)
+
+    @on.ready
+    async def fast(event):
+        return 'fast'
+
+    for attempt in range(4):
+        run(on.ashout('ready')).should.equal('fast')
+
+    probes.should.equal([0, 1, 2, 3])
+    on.breakers()[flaky.key]['skipped'].should.equal(0)
+
+
+def test_ashout_within_cancels_listeners_still_pending_after_the_budget():
+    "Speaker#ashout_within cancels the listeners that did not answer in time"
+
+    on = Speaker('on', ['ready'])
+    cancelled = []
+
+    @on.ready
+    async def quick(event):
+        return None
+
+    @on.ready
+    async def stuck(event):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append('stuck')
+            raise
+
+    started = time.time()
+    outcome = run(on.ready.ashout_within(0.05))
+    (time.time() - started).should.be.lower_than(5)
+
+    outcome.result.should.be.none
+    outcome.complete.should.be.false
+    [hook.responder.name for hook in outcome.ran].should.equal(['quick'])
+    [hook.responder.name for hook in outcome.timed_out].should.equal(['stuck'])
+    cancelled.should.equal(['stuck'])
+
+
+def test_ashout_within_returns_the_first_truthy_result_in_time():
+    "Speaker#ashout_within returns a ShoutResult with the winning answer"
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    async def slow(event, value):
+        await asyncio.sleep(10)
+
+    @on.ready
+    def doubles(event, value):
+        return value * 2
+
+    outcome = run(on.ashout_within('ready', 5, 21))
+    outcome.result.should.equal(42)
+    outcome.complete.should.be.true
+    [hook.responder.name for hook in outcome.ran].should.equal(['doubles'])
+
+    run(on.ashout_within('nothing', 5)).ran.should.be.empty
+
+
+def test_ashout_awaits_filtered_async_listeners():
+    "Speaker#ashout awaits async listeners registered with where= when the shout matches"
+
+    on = Speaker('on', ['ready'])
+
+    async def admin(event, user, role):
+        await asyncio.sleep(0)
+        return 'admin:' + user
+
+    on.for_decorator('ready', admin, where={'role': 'admin'})
+
+    run(on.ashout('ready', user='lincoln', role='admin')).should.equal('admin:lincoln')
+    run(on.ashout('ready', user='gabriel', role='guest')).should.be.none
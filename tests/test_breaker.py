@@ -0,0 +1,190 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import time
+
+from speakers.bus import Speaker
+from speakers.breaker import CircuitBreaker, Guarded, CLOSED, OPEN, HALF_OPEN
+
+
+def test_failing_hook_is_skipped_once_its_circuit_opens():
+    "Speaker#enable_circuit_breakers skips hooks that keep failing"
+
+    on = Speaker('on', ['request'])
+    failures = []
+    changes = []
+
+    @on.exception_handler
+    def handle(speaker, exception, args, kwargs):
+        failures.append(exception)
+
+    @on.request
+    def broken(event):
+        raise ValueError('boom')
+
+    @on.request
+    def healthy(event):
+        return 'ok'
+
+    on.enable_circuit_breakers(min_calls=3, window=3, reset_timeout=60,
+                               on_state_change=lambda *change: changes.append(change[1:]))
+
+    for attempt in range(5):
+        on.request.shout().should.equal('ok')
+
+    failures.should.have.length_of(3)
+    changes.should.equal([(CLOSED, OPEN)])
+
+    states = dict((key.split('[')[1], state['state']) for key, state in on.breakers().items())
+    states.should.equal({
+        'tests.test_breaker:broken:45]': OPEN,
+        'tests.test_breaker:healthy:49]': CLOSED,
+    })
+
+
+def test_half_open_probe_closes_the_circuit():
+    "An open circuit lets a single probe through after reset_timeout"
+
+    changes = []
+    breaker = CircuitBreaker('hook', min_calls=2, window=2, reset_timeout=0.01,
+                             on_state_change=lambda key, old, new: changes.append(new))
+    breaker.record(0, failed=True)
+    breaker.record(0, failed=True)
+    breaker.state.should.equal(OPEN)
+    breaker.allow().should.be.false
+
+    time.sleep(0.02)
+    breaker.allow().should.be.true
+    breaker.allow().should.be.false
+    breaker.state.should.equal(HALF_OPEN)
+
+    breaker.record(0)
+    breaker.state.should.equal(CLOSED)
+    changes.should.equal([OPEN, HALF_OPEN, CLOSED])
+    breaker.snapshot()['skipped'].should.equal(2)
+
+
+def test_failed_probe_opens_the_circuit_again():
+    "A failing probe sends the circuit back to open"
+
+    breaker = CircuitBreaker('hook', min_calls=1, window=1, reset_timeout=0.01)
+    breaker.record(0, failed=True)
+    time.sleep(0.02)
+    breaker.allow().should.be.true
+    breaker.record(0, failed=True)
+    breaker.state.should.equal(OPEN)
+    breaker.allow().should.be.false
+
+
+def test_slow_calls_count_as_failures():
+    "Calls slower than slow_seconds open the circuit"
+
+    breaker = CircuitBreaker('hook', slow_seconds=0.5, failure_rate=0.5, min_calls=4, window=4)
+    breaker.record(0.1)
+    breaker.record(0.9)
+    breaker.record(0.1)
+    breaker.state.should.equal(CLOSED)
+    breaker.record(0.9)
+    breaker.state.should.equal(OPEN)
+
+
+def test_disable_circuit_breakers():
+    "Speaker#disable_circuit_breakers calls every hook again"
+
+    on = Speaker('on', ['request'])
+    calls = []
+
+    @on.exception_handler
+    def handle(speaker, exception, args, kwargs):
+        pass
+
+    @on.request
+    def broken(event):
+        calls.append(1)
+        raise ValueError('boom')
+
+    on.enable_circuit_breakers(min_calls=1, window=1)
+    on.shout('request')
+    on.shout('request')
+    calls.should.have.length_of(1)
+
+    on.disable_circuit_breakers()
+    on.shout('request')
+    calls.should.have.length_of(2)
+    on.breakers().should.be.empty
+
+
+def test_closures_of_the_same_factory_have_their_own_breaker():
+    "Hooks sharing a responder key open their circuits independently"
+
+    on = Speaker('on', ['request'])
+    calls = []
+
+    @on.exception_handler
+    def handle(speaker, exception, args, kwargs):
+        pass
+
+    def make_hook(name, healthy):
+        def hook(event):
+            calls.append(name)
+            if not healthy:
+                raise ValueError('boom')
+        return hook
+
+    on.request(make_hook('broken', healthy=False))
+    on.request(make_hook('healthy', healthy=True))
+    on.enable_circuit_breakers(min_calls=1, window=1, reset_timeout=60)
+
+    for attempt in range(3):
+        on.shout('request')
+
+    calls.should.equal(['broken', 'healthy', 'healthy', 'healthy'])
+    states = on.breakers()
+    states.should.have.length_of(1)
+    list(states.values())[0]['state'].should.equal(OPEN)
+
+    on.release('request')
+    on.breakers().should.be.empty
+
+
+def test_interrupted_probes_are_given_back():
+    "A half-open probe interrupted by a BaseException lets the next call probe again"
+
+    breaker = CircuitBreaker('hook', min_calls=1, window=1, reset_timeout=0)
+    breaker.record(0, failed=True)
+    breaker.state.should.equal(OPEN)
+
+    def interrupted(event):
+        raise KeyboardInterrupt()
+
+    guarded = Guarded(interrupted, breaker)
+    try:
+        guarded(None)
+    except KeyboardInterrupt:
+        pass
+
+    breaker.state.should.equal(HALF_OPEN)
+    breaker.allow().should.be.true
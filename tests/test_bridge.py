@@ -0,0 +1,189 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+from speakers.bus import Speaker
+from speakers.bridge import (
+    BridgePublisher, BridgeReceiver, decode_frame, encode_frame,
+)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+
+def test_frames_roundtrip():
+    "encode_frame() packs events that decode_frame() splits back"
+
+    events = [b'first', b'', b'third event']
+    frame = encode_frame(events)
+    frame[:4].should.equal(b'\x00\x00\x00\x1c')
+    decode_frame(frame[4:]).should.equal(events)
+
+
+def bridge(address):
+    source = Speaker('cache', ['invalidated', 'warmed'])
+    replica = Speaker('cache replica', ['invalidated', 'warmed'])
+    received = []
+
+    @replica.invalidated
+    def invalidate(event, key, reason=None):
+        received.append((key, reason))
+
+    receiver = BridgeReceiver(address, resolve={'cache': replica}.get)
+    publisher = BridgePublisher([receiver.address], flush_interval=0.001)
+    publisher.forward(source, ['invalidated'])
+    return source, receiver, publisher, received
+
+
+def test_bridge_over_unix_sockets():
+    "Shouts are forwarded to the receivers over unix domain sockets"
+
+    directory = tempfile.mkdtemp()
+    try:
+        source, receiver, publisher, received = bridge(os.path.join(directory, 'bridge.sock'))
+
+        @source.invalidated
+        def local(event, key, reason=None):
+            return 'handled locally'
+
+        source.invalidated.shout('users', reason='update').should.equal('handled locally')
+        source.invalidated.shout('posts')
+        source.warmed.shout('ignored')
+
+        wait_for(lambda: len(received) == 2).should.be.true
+        received.should.equal([('users', 'update'), ('posts', None)])
+
+        publisher.close()
+        receiver.close()
+        source.hooks['invalidated'].should.have.length_of(1)
+        os.path.exists(os.path.join(directory, 'bridge.sock')).should.be.false
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_bridge_over_loopback_tcp():
+    "Shouts can be forwarded over loopback TCP instead of unix sockets"
+
+    source, receiver, publisher, received = bridge(('127.0.0.1', 0))
+    publisher.batch_size = 10
+    for index in range(25):
+        source.invalidated.shout(index)
+
+    wait_for(lambda: len(received) == 25).should.be.true
+    [key for key, reason in received].should.equal(list(range(25)))
+    publisher.sent.should.equal(25)
+    publisher.close()
+    receiver.close()
+
+
+def test_relayed_events_are_not_forwarded_again():
+    "Receivers do not forward the events they relay back to the publishers"
+
+    directory = tempfile.mkdtemp()
+    try:
+        address = os.path.join(directory, 'bridge.sock')
+        speaker = Speaker('loop', ['invalidated'])
+        heard = []
+
+        @speaker.invalidated
+        def local(event, key):
+            heard.append(key)
+
+        receiver = BridgeReceiver(address, resolve={'loop': speaker}.get)
+        publisher = BridgePublisher([address], flush_interval=0.001)
+        publisher.forward(speaker, ['invalidated'])
+
+        speaker.invalidated.shout('once')
+        wait_for(lambda: receiver.received == 1).should.be.true
+        time.sleep(0.05)
+        receiver.received.should.equal(1)
+        heard.should.equal(['once', 'once'])
+
+        publisher.close()
+        receiver.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_unpicklable_events_are_counted_as_failed():
+    "Events that cannot be serialized are not forwarded and do not break the local shout"
+
+    source, receiver, publisher, received = bridge(('127.0.0.1', 0))
+
+    @source.invalidated
+    def local(event, key, reason=None):
+        return 'handled locally'
+
+    source.invalidated.shout(threading.Lock()).should.equal('handled locally')
+    publisher.failed.should.equal(1)
+
+    source.invalidated.shout('users')
+    wait_for(lambda: len(received) == 1).should.be.true
+    received.should.equal([('users', None)])
+    publisher.close()
+    receiver.close()
+
+
+def test_undecodable_events_do_not_close_the_connection():
+    "Receivers skip the events they cannot unpickle and relay the next ones"
+
+    source, receiver, publisher, received = bridge(('127.0.0.1', 0))
+    event = pickle.dumps(('cache', 'invalidated', ('users',), {}))
+    publisher.pool.send(receiver.address, encode_frame([b'garbage', pickle.dumps('not a tuple'), event]))
+
+    wait_for(lambda: len(received) == 1).should.be.true
+    received.should.equal([('users', None)])
+    receiver.failed.should.equal(2)
+    publisher.close()
+    receiver.close()
+
+
+def test_events_are_dropped_once_max_pending_are_waiting():
+    "Publishers drop new events when max_pending events are waiting to be sent"
+
+    source, receiver, publisher, received = bridge(('127.0.0.1', 0))
+    publisher.max_pending = 2
+    with publisher.send_lock:
+        for index in range(5):
+            source.invalidated.shout(index)
+
+        publisher.dropped.should.equal(3)
+
+    wait_for(lambda: len(received) == 2).should.be.true
+    [key for key, reason in received].should.equal([0, 1])
+    publisher.close()
+    receiver.close()
@@ -0,0 +1,124 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+import time
+
+from speakers.bus import Speaker
+from speakers.deadline import Deadline, ShoutResult
+
+
+def names(hooks):
+    return [hook.__name__ for hook in hooks]
+
+
+def test_shout_within_skips_hooks_once_the_budget_is_over():
+    "Speaker#shout_within skips the hooks left when the budget is used up"
+
+    on = Speaker('on', ['request'])
+
+    @on.request
+    def fast(event):
+        pass
+
+    @on.request
+    def slow(event):
+        time.sleep(0.05)
+
+    @on.request
+    def late(event):
+        return 'late'
+
+    outcome = on.request.shout_within(0.01)
+    outcome.should.be.a(ShoutResult)
+    outcome.result.should.be.none
+    names(outcome.ran).should.equal(['fast'])
+    names(outcome.timed_out).should.equal(['slow'])
+    names(outcome.skipped).should.equal(['late'])
+    outcome.complete.should.be.false
+
+
+def test_shout_within_returns_the_first_truthy_result():
+    "Speaker#shout_within stops at the first truthy result like shout"
+
+    on = Speaker('on', ['request'])
+    on.request(lambda event, value: value * 2)
+    on.request(lambda event, value: value * 3)
+
+    outcome = on.shout_within('request', 1, 21)
+    outcome.result.should.equal(42)
+    outcome.ran.should.have.length_of(1)
+    outcome.complete.should.be.true
+
+
+def test_shared_deadline():
+    "A Deadline can be shared by several shouts"
+
+    on = Speaker('on', ['first', 'second'])
+    on.first(lambda event: time.sleep(0.03))
+    on.second(lambda event: 'second')
+
+    deadline = Deadline(0.01)
+    on.shout_within('first', deadline).timed_out.should.have.length_of(1)
+    on.shout_within('second', deadline).skipped.should.have.length_of(1)
+    deadline.remaining().should.equal(0.0)
+
+
+def test_fan_out_within_cancels_hooks_that_did_not_start():
+    "Speaker#fan_out_within cancels the hooks still queued once the budget is over"
+
+    on = Speaker('on', ['request'])
+    on.use_thread_pool(max_workers=1)
+    release = threading.Event()
+
+    @on.request
+    def blocking(event):
+        release.wait(5)
+
+    @on.request
+    def queued(event):
+        return 'queued'
+
+    try:
+        outcome = on.fan_out_within('request', 0.02)
+    finally:
+        release.set()
+
+    outcome.result.should.be.none
+    names(outcome.timed_out).should.equal(['blocking'])
+    names(outcome.skipped).should.equal(['queued'])
+
+
+def test_fan_out_within_returns_in_time():
+    "Speaker#fan_out_within returns the first truthy result in hook order"
+
+    on = Speaker('on', ['request'])
+    on.request(lambda event: None)
+    on.request(lambda event: 'answer')
+
+    outcome = on.request.fan_out_within(1)
+    outcome.result.should.equal('answer')
+    outcome.ran.should.have.length_of(2)
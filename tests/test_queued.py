@@ -0,0 +1,165 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+
+from six.moves.queue import Full
+
+from speakers.bus import Speaker
+from speakers.queued import EventQueue
+
+
+def test_emit_async_returns_before_hooks_run():
+    "Speaker#emit_async enqueues events for the background workers"
+
+    on = Speaker('on', ['page_viewed'])
+    release = threading.Event()
+    seen = []
+
+    @on.page_viewed
+    def analytics(event, page):
+        release.wait(5)
+        seen.append(page)
+
+    on.page_viewed.emit_async('/').should.be.true
+    on.emit_async('page_viewed', '/about').should.be.true
+    seen.should.equal([])
+    on.queue.metrics()['depth'].should.be.lower_than(3)
+
+    release.set()
+    on.queue.join(5).should.be.true
+    seen.should.equal(['/', '/about'])
+    on.queue.metrics()['processed'].should.equal(2)
+    on.queue.stop()
+
+
+def blocked_queue(overflow):
+    on = Speaker('on', ['page_viewed'])
+    release = threading.Event()
+    started = threading.Event()
+    seen = []
+
+    @on.page_viewed
+    def analytics(event, page):
+        started.set()
+        release.wait(5)
+        seen.append(page)
+
+    queue = on.use_queue(maxsize=2, overflow=overflow)
+    on.emit_async('page_viewed', 0)
+    started.wait(5)
+    on.emit_async('page_viewed', 1)
+    on.emit_async('page_viewed', 2)
+    return on, queue, release, seen
+
+
+def test_drop_newest_overflow():
+    "The drop-newest policy discards events emitted while the queue is full"
+
+    on, queue, release, seen = blocked_queue('drop-newest')
+    on.emit_async('page_viewed', 3).should.be.false
+    queue.metrics()['dropped'].should.equal(1)
+
+    release.set()
+    queue.join(5)
+    seen.should.equal([0, 1, 2])
+    queue.stop()
+
+
+def test_drop_oldest_overflow():
+    "The drop-oldest policy discards the oldest pending event"
+
+    on, queue, release, seen = blocked_queue('drop-oldest')
+    on.emit_async('page_viewed', 3).should.be.true
+    queue.metrics()['dropped'].should.equal(1)
+    queue.metrics()['depth'].should.equal(2)
+    queue.metrics()['lag'].should.be.greater_than(0)
+
+    release.set()
+    queue.join(5)
+    seen.should.equal([0, 2, 3])
+    queue.stop()
+
+
+def test_raise_overflow():
+    "The raise policy raises queue.Full when the queue is full"
+
+    on, queue, release, seen = blocked_queue('raise')
+    on.emit_async.when.called_with('page_viewed', 3).should.throw(Full)
+
+    release.set()
+    queue.join(5)
+    seen.should.equal([0, 1, 2])
+    queue.stop()
+
+
+def test_block_overflow():
+    "The block policy waits until the workers make room"
+
+    on, queue, release, seen = blocked_queue('block')
+    producer = threading.Thread(target=on.emit_async, args=('page_viewed', 3))
+    producer.start()
+    producer.join(0.1)
+    producer.is_alive().should.be.true
+
+    release.set()
+    producer.join(5)
+    queue.join(5)
+    seen.should.equal([0, 1, 2, 3])
+    queue.stop()
+
+
+def test_workers_honor_exception_handler():
+    "Queue workers send hook exceptions to the exception handler"
+
+    on = Speaker('on', ['page_viewed'])
+    errors = []
+
+    @on.exception_handler
+    def handler(speaker, exception, args, kwargs):
+        errors.append(args)
+
+    @on.page_viewed
+    def broken(event, page):
+        raise IOError("You got served")
+
+    on.emit_async('page_viewed', '/')
+    on.emit_async('page_viewed', '/about')
+    on.queue.join(5)
+    errors.should.equal([('/',), ('/about',)])
+    on.queue.stop()
+
+
+def test_invalid_overflow_policy():
+    "EventQueue validates its overflow policy"
+
+    on = Speaker('on', ['page_viewed'])
+
+    def make_queue(speaker, **options):
+        return EventQueue(speaker, **options)
+
+    make_queue.when.called_with(on, overflow='explode').should.throw(
+        ValueError, "overflow must be one of block, drop-oldest, drop-newest, raise")
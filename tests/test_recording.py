@@ -0,0 +1,139 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from speakers.bus import Speaker
+from speakers.recording import EventRecorder, EventReplayer, HEADER
+
+
+def log_path():
+    return os.path.join(tempfile.mkdtemp(), 'events.log')
+
+
+def test_record_and_replay():
+    "EventReplayer shouts the events captured by EventRecorder"
+
+    path = log_path()
+    on = Speaker('recorded', ['order_placed', 'order_shipped'])
+
+    @on.order_placed
+    def answer(event, order_id, total=0):
+        return 'handled'
+
+    with EventRecorder(path).record(on, ['order_placed', 'order_shipped']) as recorder:
+        on.order_placed.shout(1, total=10).should.equal('handled')
+        on.order_shipped.shout(1)
+        on.order_placed.shout(2)
+
+    recorder.count.should.equal(3)
+    on.listeners('order_placed').should.have.length_of(1)
+
+    heard = []
+    replayed = Speaker('replayed', ['order_placed', 'order_shipped'])
+    replayed.order_placed(lambda event, order_id, total=0: heard.append((order_id, total)))
+    replayed.order_shipped(lambda event, order_id: heard.append(('shipped', order_id)))
+
+    replayer = EventReplayer(path, resolve={'recorded': replayed}.get)
+    replayer.replay(speed=None).should.equal(3)
+    heard.should.equal([(1, 10), ('shipped', 1), (2, 0)])
+
+
+def test_replay_keeps_the_original_pace():
+    "EventReplayer#replay sleeps between events, scaled by speed"
+
+    path = log_path()
+    on = Speaker('paced', ['tick'])
+    with EventRecorder(path).record(on, ['tick']):
+        on.tick.shout()
+        time.sleep(0.1)
+        on.tick.shout()
+
+    replayer = EventReplayer(path, resolve=lambda name: on)
+    started = time.time()
+    replayer.replay(speed=2).should.equal(2)
+    (time.time() - started).should.be.within(0.04, 0.1)
+    replayer.replay.when.called_with(speed=0).should.throw(ValueError)
+
+
+def test_truncated_and_empty_logs():
+    "A record cut short at the end of the log is ignored"
+
+    path = log_path()
+    on = Speaker('truncated', ['tick'])
+    open(path, 'wb').close()
+    list(EventReplayer(path).events()).should.be.empty
+
+    with EventRecorder(path).record(on, ['tick']):
+        on.tick.shout(1)
+        on.tick.shout(2)
+
+    with open(path, 'ab') as stream:
+        stream.write(HEADER.pack(time.time(), 100) + b'cut')
+
+    [args for _, _, _, args, _ in EventReplayer(path).events()].should.equal([(1,), (2,)])
+
+
+class JSONSerializer(object):
+    @staticmethod
+    def dumps(event):
+        return json.dumps(event).encode('utf-8')
+
+    @staticmethod
+    def loads(payload):
+        return json.loads(payload.decode('utf-8'))
+
+
+def test_pluggable_serializer():
+    "Recorders and replayers accept any serializer with dumps and loads"
+
+    path = log_path()
+    on = Speaker('serialized', ['tick'])
+    with EventRecorder(path, serializer=JSONSerializer).record(on, ['tick']):
+        on.tick.shout(1, unit='s')
+
+    events = list(EventReplayer(path, serializer=JSONSerializer).events())
+    [event[1:] for event in events].should.equal([('serialized', 'tick', [1], {'unit': 's'})])
+
+
+def test_unserializable_shouts_are_counted_as_failed():
+    "Shouts that cannot be serialized are not recorded and do not break the shout"
+
+    path = log_path()
+    on = Speaker('unpicklable', ['ready'])
+    on.ready(lambda event, value: 'handled')
+
+    with EventRecorder(path).record(on, ['ready']) as recorder:
+        on.ready.shout(threading.Lock()).should.equal('handled')
+        on.ready.shout('fine').should.equal('handled')
+
+    recorder.failed.should.equal(1)
+    recorder.count.should.equal(1)
+    [args for timestamp, name, action, args, kw in EventReplayer(path).events()].should.equal([('fine',)])
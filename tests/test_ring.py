@@ -0,0 +1,213 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import array
+import multiprocessing
+import time
+
+from speakers.bus import Speaker
+from speakers.ring import RingConsumer, RingProducer
+
+
+def ring(slots=8, slot_size=256, **options):
+    source = Speaker('ring source', ['rendered', 'ignored'])
+    replica = Speaker('ring replica', ['rendered', 'ignored'])
+    producer = RingProducer(slots=slots, slot_size=slot_size)
+    producer.forward(source, ['rendered'])
+    consumer = RingConsumer(producer.name, resolve={'ring source': replica}.get, **options)
+    return source, replica, producer, consumer
+
+
+def test_ring_carries_pickled_events():
+    "Events written by the producer are shouted by every consumer"
+
+    source, replica, producer, consumer = ring()
+    other = RingConsumer(producer.name, resolve={'ring source': replica}.get)
+    heard = []
+
+    @replica.rendered
+    def listener(event, page, status=200):
+        heard.append((page, status))
+
+    source.rendered.shout('/', status=201)
+    source.rendered.shout('/about')
+    source.ignored.shout('nope')
+
+    consumer.poll().should.equal(2)
+    consumer.poll().should.equal(0)
+    other.poll().should.equal(2)
+    heard.should.equal([('/', 201), ('/about', 200), ('/', 201), ('/about', 200)])
+
+    consumer.close()
+    other.close()
+    producer.close()
+    source.hooks['rendered'].should.be.empty
+
+
+def test_ring_passes_buffers_without_copies():
+    "Buffer payloads reach the listeners as views of the shared memory"
+
+    source, replica, producer, consumer = ring()
+    heard = []
+
+    @replica.rendered
+    def listener(event, payload):
+        heard.append((type(payload), bytes(payload)))
+
+    source.rendered.shout(b'raw bytes')
+    source.rendered.shout(array.array('B', [1, 2, 3]))
+    consumer.poll()
+
+    heard.should.equal([
+        (memoryview, b'raw bytes'),
+        (memoryview, b'\x01\x02\x03'),
+    ])
+    consumer.close()
+    producer.close()
+
+
+def test_ring_consumers_can_copy_buffers():
+    "Consumers created with copy=True hand listeners bytes"
+
+    source, replica, producer, consumer = ring(copy=True)
+    heard = []
+    replica.rendered(lambda event, payload: heard.append(payload))
+
+    source.rendered.shout(bytearray(b'copied'))
+    consumer.poll()
+    heard.should.equal([b'copied'])
+    consumer.close()
+    producer.close()
+
+
+def test_slow_consumers_lose_overwritten_events():
+    "Consumers that fall behind by more than the ring size lose events"
+
+    source, replica, producer, consumer = ring(slots=4)
+    heard = []
+    replica.rendered(lambda event, index: heard.append(index))
+
+    for index in range(10):
+        source.rendered.shout(index)
+
+    consumer.poll().should.equal(4)
+    consumer.lost.should.equal(6)
+    heard.should.equal([6, 7, 8, 9])
+    consumer.close()
+    producer.close()
+
+
+def test_events_larger_than_slots_are_dropped():
+    "The producer drops events that do not fit in a slot without failing the shout"
+
+    source, replica, producer, consumer = ring(slot_size=64)
+    source.rendered(lambda event, payload: 'handled locally')
+
+    source.rendered.shout(b'x' * 100).should.equal('handled locally')
+    producer.dropped.should.equal(1)
+    source.rendered.shout(b'fits')
+    consumer.poll().should.equal(1)
+    consumer.close()
+    producer.close()
+
+
+def test_views_overwritten_while_listeners_run_are_counted_as_torn():
+    "Consumers count the zero-copy events the producer overwrote while listeners read them"
+
+    source, replica, producer, consumer = ring(slots=2)
+    heard = []
+
+    @replica.rendered
+    def listener(event, payload):
+        if not heard:
+            # the producer wraps around onto the slot being read
+            for index in range(2):
+                producer.write('ring source', 'rendered', (b'next',), {})
+
+        heard.append(bytes(payload))
+
+    source.rendered.shout(b'first')
+    consumer.poll().should.equal(1)
+    consumer.torn.should.equal(1)
+    heard.should.have.length_of(1)
+
+    consumer.poll().should.equal(2)
+    consumer.torn.should.equal(1)
+    consumer.close()
+    producer.close()
+
+
+def consume_in_child(name, results):
+    replica = Speaker('ring child', ['rendered'])
+    replica.rendered(lambda event, page: results.put(page))
+    consumer = RingConsumer(name, resolve={'ring source': replica}.get).start()
+    results.put('ready')
+    time.sleep(1)
+    consumer.close()
+
+
+def test_ring_between_processes():
+    "Consumers in other processes hear the events of the producer"
+
+    source = Speaker('ring source', ['rendered'])
+    producer = RingProducer(slots=16, slot_size=256)
+    producer.forward(source, ['rendered'])
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    child = context.Process(target=consume_in_child, args=(producer.name, results))
+    child.start()
+    results.get(timeout=5).should.equal('ready')
+
+    source.rendered.shout('/from-parent')
+    results.get(timeout=5).should.equal('/from-parent')
+    child.join(5)
+    producer.close()
+
+
+class Vanishing(object):
+    "a class consumers fail to find when unpickling"
+
+
+def test_undecodable_events_are_counted_as_failed():
+    "Consumers skip the events they cannot decode and read the next ones"
+
+    source, replica, producer, consumer = ring()
+    heard = []
+    replica.rendered(lambda event, page: heard.append(page))
+
+    source.rendered.shout(Vanishing())
+    source.rendered.shout('/after')
+    vanishing = globals().pop('Vanishing')
+    try:
+        consumer.poll().should.equal(1)
+    finally:
+        globals()['Vanishing'] = vanishing
+
+    consumer.failed.should.equal(1)
+    heard.should.equal(['/after'])
+    consumer.close()
+    producer.close()
@@ -25,7 +25,7 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 
 from mock import Mock
-from speakers.bus import Function, Speaker
+from speakers.bus import Action, Function, Speaker
 from speakers.bus import _function_matches
 
 
@@ -278,3 +278,1345 @@ def test_unregister_all_listeners():
     when.hooks['loading'].should.be.empty
     after.hooks['ready'].should.be.empty
     after.hooks['loading'].should.be.empty
+
+
+def test_shout_handles_see_hooks_plugged_later():
+    "action.shout keeps dispatching to hooks plugged after it was referenced"
+
+    on = Speaker('on', ['ready'])
+    shout = on.ready.shout
+
+    shout().should.be.none
+
+    @on.ready
+    def first(event):
+        return 'first'
+
+    shout().should.equal('first')
+
+    on.ready.unplug(first)
+    shout().should.be.none
+
+
+def test_dispatch_plan_rebuilt_on_changes():
+    "Speaker#compile is rebuilt whenever hooks are plugged or unplugged"
+
+    on = Speaker('on', ['ready'])
+    empty_plan = on._plans['ready']
+
+    @on.ready
+    def first(event):
+        pass
+
+    single_plan = on._plans['ready']
+    single_plan.shouldnt.equal(empty_plan)
+
+    @on.ready
+    def second(event):
+        return 'second'
+
+    on._plans['ready'].shouldnt.equal(single_plan)
+    on.shout('ready').should.equal('second')
+
+    on.release('ready')
+    on._plans['ready'].should.equal(empty_plan)
+
+
+def test_shouting_undeclared_action():
+    "Shouting an action nobody declared returns None"
+
+    on = Speaker('on', ['ready'])
+    on.shout('unknown').should.be.none
+
+
+def test_plans_are_compiled_once_after_many_changes():
+    "Plugging hooks marks the plan stale, the next shout compiles it once"
+    from speakers.bus import _Stale
+
+    on = Speaker('on', ['ready'])
+    compiled = []
+    original = on._compile
+    on._compile = lambda action: compiled.append(action) or original(action)
+
+    for index in range(100):
+        on.ready(lambda event, index=index: index)
+
+    on._plans['ready'].should.be.a(_Stale)
+    compiled.should.be.empty
+
+    on.ready.shout().should.equal(1)
+    on.listeners('ready').should.have.length_of(100)
+    compiled.should.equal(['ready'])
+    on._plans['ready'].shouldnt.be.a(_Stale)
+
+
+def test_fan_out_runs_hooks_concurrently():
+    "Speaker#fan_out dispatches to all hooks through the thread pool"
+    import time
+
+    on = Speaker('on', ['ready'])
+    on.use_thread_pool(max_workers=4)
+
+    @on.ready
+    def slow1(event, value):
+        time.sleep(0.2)
+
+    @on.ready
+    def slow2(event, value):
+        time.sleep(0.2)
+
+    @on.ready
+    def slow3(event, value):
+        time.sleep(0.2)
+        return value
+
+    started = time.time()
+    on.ready.fan_out('done').should.equal('done')
+    (time.time() - started).should.be.lower_than(0.5)
+
+
+def test_fan_out_first_truthy_in_hook_order():
+    "Speaker#fan_out returns the first truthy result in hook order"
+    import time
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    def slow(event):
+        time.sleep(0.1)
+        return 'slow'
+
+    @on.ready
+    def fast(event):
+        return 'fast'
+
+    on.fan_out('ready').should.equal('slow')
+    on.fan_out('unknown').should.be.none
+
+
+def test_gather_returns_all_results_in_order():
+    "Speaker#gather returns the results of every hook in hook order"
+    import time
+
+    on = Speaker('on', ['ready'])
+    errors = []
+
+    @on.exception_handler
+    def handler(speaker, exception, args, kwargs):
+        errors.append(exception)
+        return 'handled'
+
+    @on.ready
+    def first(event, value):
+        time.sleep(0.1)
+        return value + 1
+
+    @on.ready
+    def second(event, value):
+        return None
+
+    @on.ready
+    def third(event, value):
+        raise IOError("You got served")
+
+    on.ready.gather(1).should.equal([2, None, 'handled'])
+    errors.should.have.length_of(1)
+    errors[0].should.be.an(IOError)
+    on.gather('unknown').should.equal([])
+
+
+def test_fan_out_raises_by_default():
+    "Speaker#fan_out raises hook exceptions by default"
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    def broken(event):
+        raise IOError("You got served")
+
+    on.fan_out.when.called_with('ready').should.throw(IOError, "You got served")
+
+
+def square_in_process(event, value):
+    import os
+    return os.getpid(), event.name, value * value
+
+
+def test_process_hooks_run_in_process_pool():
+    "Hooks registered with process=True run in the speaker's process pool"
+    import os
+
+    on = Speaker('on', ['compute'])
+    on.compute(process=True)(square_in_process)
+
+    pid, name, result = on.compute.shout(7)
+    pid.shouldnt.equal(os.getpid())
+    name.should.equal('on')
+    result.should.equal(49)
+
+    on.compute.gather(3).should.have.length_of(1)
+    on.process_pool.shutdown()
+
+
+def test_process_hooks_must_be_picklable():
+    "Hooks registered with process=True are checked for picklability"
+
+    on = Speaker('on', ['compute'])
+
+    def nested(event):
+        pass
+
+    on.for_decorator.when.called_with('compute', nested, process=True).should.throw(
+        TypeError, 'cannot run in a process pool because it is not picklable')
+    on.hooks['compute'].should.be.empty
+
+
+def test_process_hooks_exceptions_reach_handler():
+    "Exceptions raised in the process pool reach the exception handler"
+
+    on = Speaker('on', ['compute'])
+    errors = []
+
+    @on.exception_handler
+    def handler(speaker, exception, args, kwargs):
+        errors.append(exception)
+
+    on.compute(process=True)(square_in_process)
+    on.compute.shout('not a number').should.be.none
+    errors.should.have.length_of(1)
+    errors[0].should.be.a(TypeError)
+    on.process_pool.shutdown()
+
+
+def test_speakers_are_picklable():
+    "Speakers pickle as a reference to the registered instance"
+    import pickle
+
+    on = Speaker('pickled', ['ready'])
+    pickle.loads(pickle.dumps(on)).should.be(on)
+
+
+def test_shout_many_calls_hooks_per_item():
+    "Speaker#shout_many calls regular hooks once per item"
+
+    after = Speaker('after', ['getting_sql_results'])
+    rows = []
+
+    @after.getting_sql_results
+    def collect(event, row, source):
+        rows.append((row, source))
+
+    total = after.getting_sql_results.shout_many(
+        ((i,) for i in range(3)), source='db')
+
+    total.should.equal(3)
+    rows.should.equal([(0, 'db'), (1, 'db'), (2, 'db')])
+
+
+def test_shout_many_hands_chunks_to_batch_hooks():
+    "Speaker#shout_many hands whole chunks to batch-capable hooks"
+
+    after = Speaker('after', ['getting_sql_results'])
+    after.batch_size = 2
+    batches = []
+    consumed = []
+    seen = []
+
+    @after.getting_sql_results(batch=True)
+    def collect(event, batch):
+        batches.append(batch)
+        seen.append(len(consumed))
+
+    def rows():
+        for i in range(5):
+            consumed.append(i)
+            yield (i,)
+
+    after.shout_many('getting_sql_results', rows()).should.equal(5)
+    batches.should.equal([[(0,), (1,)], [(2,), (3,)], [(4,)]])
+    seen.should.equal([2, 4, 5])
+
+    after.getting_sql_results.shout(9)
+    batches[-1].should.equal([(9,)])
+
+
+def test_shout_many_exception_handler():
+    "Speaker#shout_many sends exceptions to the exception handler"
+
+    after = Speaker('after', ['getting_sql_results'])
+    errors = []
+
+    @after.exception_handler
+    def handler(speaker, exception, args, kwargs):
+        errors.append(args)
+
+    @after.getting_sql_results
+    def broken(event, row):
+        if row % 2:
+            raise IOError("You got served")
+
+    after.shout_many('getting_sql_results', [(1,), (2,), (3,)])
+    errors.should.equal([(1,), (3,)])
+
+
+def test_shout_many_stops_each_item_at_its_first_truthy_result():
+    "Speaker#shout_many skips the hooks after the one that answered an item"
+
+    on = Speaker('on', ['row'])
+    heard = []
+    batches = []
+
+    @on.row
+    def evens(event, number):
+        return number % 2 == 0
+
+    @on.row
+    def odds(event, number):
+        heard.append(number)
+
+    @on.row(batch=True)
+    def rest(event, batch):
+        batches.append(batch)
+
+    for number in range(4):
+        on.row.shout(number)
+
+    heard.should.equal([1, 3])
+    del heard[:], batches[:]
+
+    on.row.shout_many([(number,) for number in range(4)]).should.equal(4)
+    heard.should.equal([1, 3])
+    batches.should.equal([[(1,), (3,)]])
+
+
+def test_pattern_subscriptions():
+    "Speaker#subscribe hooks into every action matching a pattern"
+
+    on = Speaker('on', ['file_created', 'file_deleted', 'dir_created'])
+    heard = []
+
+    @on.subscribe('file_*')
+    def audit(event, path):
+        heard.append(path)
+
+    on.file_created.shout('a')
+    on.file_deleted.shout('b')
+    on.dir_created.shout('c')
+    heard.should.equal(['a', 'b'])
+
+    on.shout('file_moved', 'd')
+    heard.should.equal(['a', 'b', 'd'])
+
+
+def test_namespaced_pattern_subscriptions():
+    "Patterns can use dots to address namespaced actions"
+
+    on = Speaker('on', ['file.created', 'http.request'])
+    heard = []
+
+    @on.subscribe('file.*')
+    def audit(event):
+        heard.append('file')
+
+    @on.subscribe('*')
+    def everything(event):
+        heard.append('everything')
+
+    on.shout('file.created')
+    on.http_request.shout()
+    heard.should.equal(['file', 'everything', 'everything'])
+
+
+def test_pattern_and_action_hooks_keep_registration_order():
+    "Pattern hooks are dispatched in registration order along with action hooks"
+
+    on = Speaker('on', ['file_created'])
+    heard = []
+
+    @on.file_created
+    def first(event):
+        heard.append('first')
+
+    @on.subscribe('file_*')
+    def second(event):
+        heard.append('second')
+
+    @on.file_created
+    def third(event):
+        heard.append('third')
+
+    on.file_created.shout()
+    heard.should.equal(['first', 'second', 'third'])
+
+
+def test_unplug_pattern_subscription():
+    "Pattern subscriptions can be unplugged and released"
+
+    on = Speaker('on', ['file_created'])
+
+    @on.subscribe('file_*')
+    def audit(event):
+        return 'audited'
+
+    on.file_created.shout().should.equal('audited')
+    on.unplug('file_*', audit)
+    on.file_created.shout().should.be.none
+
+    on.subscribe('file_*', lambda event: 'again')
+    on.file_created.shout().should.equal('again')
+    on.release()
+    on.file_created.shout().should.be.none
+    on._patterns.root.should.be.empty
+
+
+def test_invalid_patterns():
+    "Wildcards are only supported at the end of patterns"
+
+    on = Speaker('on', ['file_created'])
+    on.subscribe.when.called_with('file_created', lambda event: None).should.throw(
+        ValueError, "patterns must end with '*'")
+    on.subscribe.when.called_with('*_created*', lambda event: None).should.throw(
+        ValueError, 'wildcards are only supported at the end of a pattern')
+
+
+def test_dotted_and_underlined_action_names_are_the_same_action():
+    "Hooks and patterns registered with dotted names reach the same hooks whatever the shouted spelling"
+
+    calls = []
+    on = Speaker('storage', ['file_created'])
+    direct = on.for_decorator('file.created', lambda event: calls.append('direct'))
+
+    def pattern(event):
+        calls.append('pattern')
+
+    on.subscribe('file.*', pattern)
+    on.subscribe('file_*', pattern)
+
+    for action in ('file.created', 'file_created'):
+        on.shout(action)
+    on.file_created.shout()
+
+    calls.should.equal(['direct', 'pattern'] * 3)
+    set(on.hooks.keys()).should.equal(set(['file_created', 'file_*']))
+    on._plans.should_not.contain('file.created')
+
+    on.unplug('file_created', direct)
+    on.listeners('file.created').should.have.length_of(1)
+
+    on.release('file.*')
+    on.listeners('file_created').should.be.empty
+
+
+def test_plans_of_undeclared_actions_are_bounded():
+    "Plans of undeclared actions matching a pattern are only kept for the most recent names"
+
+    from speakers import bus
+
+    heard = []
+    on = Speaker('users', [])
+    on.subscribe('user_*', lambda event: heard.append(event))
+
+    for user_id in range(bus.UNDECLARED_PLANS * 3):
+        on.shout('user_{0}'.format(user_id))
+
+    heard.should.have.length_of(bus.UNDECLARED_PLANS * 3)
+    len(on._plans).should.equal(bus.UNDECLARED_PLANS)
+    len(on._dispatched).should.equal(bus.UNDECLARED_PLANS)
+    on.listeners('user_0').should.have.length_of(1)
+
+
+def test_stats_are_disabled_by_default():
+    "Speakers do not instrument hooks unless stats are enabled"
+
+    on = Speaker('on', ['ready'])
+
+    @on.ready
+    def listener(event):
+        pass
+
+    on.ready.shout()
+    on.stats().should.equal({})
+    on.listeners('ready').should.equal((listener.call,))
+
+
+def test_stats_record_hook_calls():
+    "Speaker#stats reports calls, exceptions, truthy results and latencies per hook"
+
+    on = Speaker('on', ['ready'])
+    on.enable_stats()
+
+    @on.exception_handler
+    def handler(speaker, exception, args, kwargs):
+        pass
+
+    @on.ready
+    def flaky(event, value):
+        if value == 'boom':
+            raise IOError("You got served")
+        return value
+
+    on.ready.shout('yes')
+    on.ready.shout(None)
+    on.ready.shout('boom')
+
+    stats = on.stats()[flaky.key]
+    stats['key'].should.equal(flaky.key)
+    stats['calls'].should.equal(3)
+    stats['exceptions'].should.equal(1)
+    stats['truthy'].should.equal(1)
+    stats['slowest_seconds'].should.be.lower_than(1)
+    sum(hits for bound, hits in stats['histogram']).should.equal(3)
+
+    on.disable_stats()
+    on.ready.shout('yes')
+    on.stats()[flaky.key]['calls'].should.equal(3)
+
+    on.reset_stats()
+    on.stats().should.equal({})
+
+
+def test_weak_hooks_of_bound_methods():
+    "Weak hooks of bound methods unplug themselves once their instance is collected"
+    import gc
+
+    on = Speaker('on', ['request'])
+
+    class Handler(object):
+        def handle(self, event, value):
+            return value
+
+    handler = Handler()
+    on.request(handler.handle, weak=True)
+    on.request.shout('ok').should.equal('ok')
+    on.hooks['request'].should.have.length_of(1)
+
+    del handler
+    gc.collect()
+    on.hooks['request'].should.be.empty
+    on.request.shout('ok').should.be.none
+
+
+def test_weak_hooks_of_functions():
+    "Weak hooks of functions stay alive as long as the function does"
+    import gc
+
+    on = Speaker('on', ['request'])
+
+    @on.request(weak=True)
+    def listener(event):
+        return 'heard'
+
+    gc.collect()
+    on.request.shout().should.equal('heard')
+
+    on.request.unplug(listener)
+    on.request.shout().should.be.none
+
+    on.request(lambda event: 'lambda', weak=True)
+    gc.collect()
+    on.hooks['request'].should.be.empty
+
+
+def test_weak_process_hooks_are_forbidden():
+    "Hooks cannot be weak and run in a process pool at the same time"
+
+    on = Speaker('on', ['compute'])
+    on.for_decorator.when.called_with('compute', square_in_process, weak=True, process=True).should.throw(
+        TypeError, 'cannot be both a weak and a process hook')
+
+
+def test_speakers_registry_is_weak():
+    "The global registry does not keep speakers alive"
+    import gc
+    import weakref
+    from speakers.bus import SPEAKERS
+
+    reference = weakref.ref(Speaker('ephemeral', ['ready']))
+    gc.collect()
+    reference().should.be.none
+    SPEAKERS.shouldnt.contain('ephemeral')
+
+
+def test_function_metadata_is_lazy():
+    "Function computes its filename, module name and key on first access"
+
+    def testing(event):
+        pass
+
+    s = Function(testing)
+    s._filename.should.be.none
+    s.shouldnt.have.property('__dict__')
+    Function.key.fget.when.called_with(s).should.throw(
+        AttributeError, 'is not plugged into any speaker')
+
+    s.module_name.should.equal('tests.test_signal_system')
+    s._filename.should.equal('tests/test_signal_system.py')
+
+
+def test_hook_keys_are_computed_on_demand():
+    "Hook keys are only formatted when somebody asks for them"
+
+    on = Speaker('on', ['file.created'])
+
+    @on.file_created
+    def obeyer(event):
+        pass
+
+    obeyer._key.should.be.none
+    obeyer.key.should.equal('on:file_created[tests.test_signal_system:obeyer:{0}]'.format(obeyer.lineno))
+    on.hooks['file_created'][0].shouldnt.have.property('__dict__')
+
+    audit = on.subscribe('file.*', lambda event: None)
+    audit.key.should.match(r'^on:file_\*\[tests.test_signal_system:<lambda>:\d+\]$')
+
+
+def test_registering_the_same_listener_twice_is_idempotent():
+    "Plugging the same callback twice into an action keeps a single hook"
+
+    on = Speaker('on', ['ready'])
+    calls = []
+
+    def listener(event):
+        calls.append(event)
+
+    class Handler(object):
+        def handle(self, event):
+            calls.append(self)
+
+    handler = Handler()
+
+    first = on.ready(listener)
+    on.ready(listener).should.be(first)
+    on.ready(handler.handle)
+    on.ready(handler.handle)
+    on.hooks['ready'].should.have.length_of(2)
+
+    on.ready.shout()
+    calls.should.equal([on, handler])
+
+    on.ready.unplug(handler.handle)
+    on.ready.unplug(first)
+    on.hooks['ready'].should.be.empty
+    on.ready.unplug(listener)
+
+
+def test_closures_from_the_same_code_are_distinct_listeners():
+    "Closures created by the same code are plugged as distinct hooks"
+
+    on = Speaker('on', ['ready'])
+    calls = []
+
+    for index in range(3):
+        on.ready(lambda event, index=index: calls.append(index))
+
+    on.hooks['ready'].should.have.length_of(3)
+    on.ready.shout()
+    calls.should.equal([0, 1, 2])
+
+
+def test_reimported_listeners_replace_the_old_version():
+    "Listeners of a re-imported module take the place of their old version"
+    import os
+    import sys
+    import shutil
+    import tempfile
+
+    on = Speaker('reloadable', ['ready'])
+    directory = tempfile.mkdtemp()
+    source = '\n'.join([
+        'from speakers.bus import SPEAKERS',
+        'on = SPEAKERS["reloadable"]',
+        '@on.ready',
+        'def listener(event):',
+        '    return "listener"',
+    ])
+    with open(os.path.join(directory, 'reloadable_plugin.py'), 'w') as fd:
+        fd.write(source)
+
+    sys.path.insert(0, directory)
+    try:
+        import reloadable_plugin
+        old_listener = reloadable_plugin.listener
+
+        @on.ready
+        def last(event):
+            return 'last'
+
+        del sys.modules['reloadable_plugin']
+        import reloadable_plugin  # noqa: F811
+    finally:
+        sys.path.remove(directory)
+        sys.modules.pop('reloadable_plugin', None)
+        shutil.rmtree(directory)
+
+    on.hooks['ready'].should.have.length_of(2)
+    on.hooks['ready'][0].callback.should.be(reloadable_plugin.listener.call)
+    on.ready.shout().should.equal('listener')
+
+    on.ready.unplug(old_listener)
+    on.hooks['ready'].should.have.length_of(1)
+    on.ready.shout().should.equal('last')
+
+
+def test_listeners_sharing_a_code_location_are_not_reloads():
+    "Distinct listeners defined on the same line or with exec are all plugged"
+
+    on = Speaker('on', ['ready'])
+    calls = []
+
+    first, second = (lambda event: calls.append('first')), (lambda event: calls.append('second'))
+    on.ready(first)
+    on.ready(second)
+
+    namespace = {'calls': calls}
+    for index in range(3):
+        exec('def generated(event):\n    calls.append({0})'.format(index), namespace)
+        on.ready(namespace['generated'])
+
+    on.hooks['ready'].should.have.length_of(5)
+    on.ready.shout()
+    calls.should.equal(['first', 'second', 0, 1, 2])
+
+    on.ready.unplug(first)
+    on.hooks['ready'].should.have.length_of(4)
+
+
+def test_hooks_with_higher_priority_run_first():
+    "Hooks are dispatched by descending priority, then in registration order"
+
+    on = Speaker('on', ['request'])
+    calls = []
+
+    @on.request
+    def expensive(event, user):
+        calls.append('expensive')
+        return 'rendered'
+
+    @on.request(priority=10)
+    def guard(event, user):
+        calls.append('guard')
+        if not user:
+            return 'forbidden'
+
+    @on.request(priority=10)
+    def second_guard(event, user):
+        calls.append('second_guard')
+
+    @on.request(priority=-1)
+    def fallback(event, user):
+        calls.append('fallback')
+
+    [hook.responder.name for hook in on.hooks['request']].should.equal(
+        ['guard', 'second_guard', 'expensive', 'fallback'])
+
+    on.request.shout(None).should.equal('forbidden')
+    calls.should.equal(['guard'])
+
+    on.request.unplug(guard)
+    on.request.shout('user').should.equal('rendered')
+    calls.should.equal(['guard', 'second_guard', 'expensive'])
+
+
+def test_priorities_apply_to_pattern_subscriptions():
+    "Pattern hooks are ordered by priority along with action hooks"
+
+    on = Speaker('on', ['file_created'])
+    calls = []
+
+    on.file_created(lambda event: calls.append('action'))
+    on.subscribe('file_*', lambda event: calls.append('pattern'), priority=1)
+
+    on.file_created.shout()
+    calls.should.equal(['pattern', 'action'])
+
+
+def test_coalesce_last_value_wins():
+    "Coalesced actions only dispatch the last shout of a window"
+
+    on = Speaker('on', ['config_changed'])
+    seen = []
+
+    @on.config_changed
+    def reload_config(event, config):
+        seen.append(config)
+
+    on.coalesce('config_changed', window=None)
+    for version in range(100):
+        on.config_changed.shout(version).should.be.none
+
+    seen.should.equal([])
+    on.flush('config_changed').should.equal(1)
+    seen.should.equal([99])
+    on.flush().should.equal(0)
+
+    on.uncoalesce('config_changed')
+    on.config_changed.shout('direct')
+    seen.should.equal([99, 'direct'])
+
+
+def test_coalesce_by_key():
+    "Coalesced actions with a key keep the last shout per key"
+
+    on = Speaker('on', ['cache_invalidated'])
+    seen = []
+
+    @on.cache_invalidated
+    def invalidate(event, key, version):
+        seen.append((key, version))
+
+    on.coalesce('cache_invalidated', window=None, key=lambda key, version: key)
+    on.cache_invalidated.shout('users', 1)
+    on.cache_invalidated.shout('posts', 1)
+    on.cache_invalidated.shout('users', 2)
+
+    on.flush().should.equal(2)
+    seen.should.equal([('posts', 1), ('users', 2)])
+
+
+def test_coalesce_window_timer():
+    "Coalesced shouts are dispatched once the window is over"
+    import time
+
+    on = Speaker('on', ['config_changed'])
+    seen = []
+
+    @on.config_changed
+    def reload_config(event, config):
+        seen.append(config)
+
+    on.coalesce('config_changed', window=0.05)
+    on.config_changed.shout(1)
+    on.config_changed.shout(2)
+
+    deadline = time.time() + 5
+    while not seen and time.time() < deadline:
+        time.sleep(0.01)
+
+    seen.should.equal([2])
+
+
+def test_debounce_restarts_the_window():
+    "Debounced actions wait until shouts stop for a whole window"
+    import time
+
+    on = Speaker('on', ['resized'])
+    seen = []
+
+    @on.resized
+    def relayout(event, size):
+        seen.append(size)
+
+    on.coalesce('resized', window=0.2, debounce=True)
+    for size in range(4):
+        on.resized.shout(size)
+        time.sleep(0.1)
+
+    seen.should.equal([])
+    on._coalescers['resized'].shouts.should.equal(4)
+    on.flush('resized')
+    seen.should.equal([3])
+
+
+def test_coalesced_plans_follow_new_hooks():
+    "Coalesced actions dispatch to hooks plugged after coalesce()"
+
+    on = Speaker('on', ['config_changed'])
+    seen = []
+    on.coalesce('config_changed', window=None)
+    on.config_changed.shout('v1')
+
+    on.config_changed(lambda event, config: seen.append(config))
+    on.flush()
+    seen.should.equal(['v1'])
+
+
+def test_cacheable_hooks_are_memoized():
+    "Shouts of actions with cacheable hooks only are served from a cache"
+
+    on = Speaker('on', ['lookup'])
+    calls = []
+
+    @on.lookup(cacheable=True)
+    def find_user(event, user_id, active=True):
+        calls.append(user_id)
+        return {'id': user_id}
+
+    on.lookup.shout(1).should.equal({'id': 1})
+    on.lookup.shout(1).should.equal({'id': 1})
+    on.lookup.shout(1, active=True).should.equal({'id': 1})
+    on.lookup.shout(1, active=True)
+    on.lookup.shout(2)
+    calls.should.equal([1, 1, 2])
+
+    info = on.cache_info('lookup')
+    info['hits'].should.equal(2)
+    info['misses'].should.equal(3)
+    info['size'].should.equal(3)
+
+    on.lookup.shout([1])
+    on.cache_info('lookup')['size'].should.equal(3)
+
+
+def test_cache_is_invalidated_when_hooks_change():
+    "Plugging or unplugging hooks clears the result cache of the action"
+
+    on = Speaker('on', ['lookup'])
+
+    @on.lookup(cacheable=True)
+    def first(event, key):
+        return None
+
+    on.lookup.shout('a').should.be.none
+
+    @on.lookup(cacheable=True)
+    def second(event, key):
+        return 'second'
+
+    on.lookup.shout('a').should.equal('second')
+    on.lookup.unplug(second)
+    on.lookup.shout('a').should.be.none
+
+
+def test_cacheable_hooks_mixed_with_regular_hooks():
+    "Cacheable hooks are memoized one by one when other hooks are not cacheable"
+
+    on = Speaker('on', ['lookup'])
+    calls = []
+
+    @on.lookup(cacheable=True)
+    def pure(event, key):
+        calls.append('pure')
+
+    @on.lookup
+    def impure(event, key):
+        calls.append('impure')
+
+    on.lookup.shout('a')
+    on.lookup.shout('a')
+    calls.should.equal(['pure', 'impure', 'impure'])
+
+
+def test_cache_lru_and_ttl_eviction():
+    "Result caches are bounded and can expire entries"
+    import time
+
+    on = Speaker('on', ['lookup'])
+    calls = []
+
+    @on.lookup(cacheable=True)
+    def find(event, key):
+        calls.append(key)
+        return key
+
+    on.configure_cache('lookup', maxsize=2)
+    on.lookup.shout('a')
+    on.lookup.shout('b')
+    on.lookup.shout('a')
+    on.lookup.shout('c')
+    on.lookup.shout('b')
+    calls.should.equal(['a', 'b', 'c', 'b'])
+    on.cache_info('lookup')['evictions'].should.equal(2)
+
+    on.configure_cache('lookup', ttl=0.05)
+    on.lookup.shout('a')
+    on.lookup.shout('a')
+    time.sleep(0.1)
+    on.lookup.shout('a')
+    calls[-3:].should.equal(['b', 'a', 'a'])
+
+
+def test_handled_exceptions_of_cacheable_hooks_are_not_cached():
+    "What the exception handler returns for a cacheable hook is never served from the cache"
+
+    on = Speaker('on', ['lookup'])
+    calls = []
+    on.exception_handler(lambda speaker, exception, args, kwargs: None)
+
+    @on.lookup(cacheable=True)
+    def find(event, key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise IOError('database went away')
+
+        return key.upper()
+
+    on.lookup.shout('a').should.be.none
+    on.lookup.shout('a').should.equal('A')
+    on.lookup.shout('a').should.equal('A')
+    calls.should.equal(['a', 'a'])
+
+
+def test_actions_are_created_lazily():
+    "Speaker only builds the Action of a declared action once it is used"
+
+    names = ['action_{0}'.format(index) for index in range(1000)]
+    on = Speaker('on', names)
+    on._actions.should.be.empty
+
+    heard = []
+    on.action_7(lambda event, value: heard.append(value))
+    list(on._actions).should.equal(['action_7'])
+    on.action_7.should.be(on._actions['action_7'])
+
+    on.shout('action_8', 'unused').should.be.none
+    on.action_7.shout('used')
+    heard.should.equal(['used'])
+    list(on._actions).should.equal(['action_7'])
+
+    getattr.when.called_with(on, 'action_1000').should.throw(AttributeError)
+
+
+def test_lazy_actions_reach_pattern_subscribers():
+    "Pattern subscribers hear declared actions that were never accessed"
+
+    on = Speaker('on', ['file_created', 'file_deleted'])
+
+    @on.subscribe('file_*')
+    def audit(event, path):
+        return path
+
+    on.file_deleted.shout('a').should.equal('a')
+    on.shout('file_created', 'b').should.equal('b')
+    list(on.actions).should.equal(['file_created', 'file_deleted'])
+
+
+def test_actions_cannot_shadow_speaker_attributes():
+    "Declaring an action named like a Speaker attribute raises ValueError"
+
+    def declare(name, actions):
+        return Speaker(name, actions)
+
+    declare.when.called_with('cache', ['flush', 'evicted']).should.throw(
+        ValueError, 'flush cannot be declared as actions of cache, they are Speaker attributes, '
+        'use cache.action(name) to plug and shout them')
+    declare.when.called_with('http', ['parent', 'queue']).should.throw(ValueError, 'parent, queue')
+
+    cache = Speaker('cache', ['evicted'])
+    cache.evicted.should.be.an(Action)
+
+
+def test_actions_named_like_speaker_attributes_are_reachable_through_action():
+    "Speaker.action() plugs and shouts names taken by Speaker attributes"
+
+    cache = Speaker('cache', ['evicted'])
+    flush = cache.action('flush')
+    flush.should.be.an(Action)
+    cache.action('flush').should.be(flush)
+    cache.flush.should_not.be(flush)
+
+    @flush
+    def flushed(event, key):
+        return 'flushed {0}'.format(key)
+
+    flush.shout('users').should.equal('flushed users')
+    cache.shout('flush', 'users').should.equal('flushed users')
+    cache.action('evicted').should.be(cache.evicted)
+
+
+def test_filtered_hooks_only_hear_matching_shouts():
+    "Hooks registered with where= only hear shouts with matching keyword arguments"
+
+    on = Speaker('on', ['invoice_paid'])
+    heard = []
+
+    for tenant in ['acme', 'globex', 'initech']:
+        on.invoice_paid(lambda event, amount, tenant, name=tenant: heard.append((name, amount)),
+                        where={'tenant': tenant})
+
+    @on.invoice_paid
+    def audit(event, amount, tenant):
+        heard.append(('audit', amount))
+
+    on.invoice_paid.shout(10, tenant='globex')
+    on.invoice_paid.shout(20, tenant='unknown')
+    heard.should.equal([('globex', 10), ('audit', 10), ('audit', 20)])
+
+
+def test_filters_on_several_arguments_keep_hook_order():
+    "Matching hooks of different filters are dispatched in hook order"
+
+    on = Speaker('on', ['deployed'])
+    heard = []
+
+    @on.deployed(where={'env': 'prod', 'region': 'eu'})
+    def eu(event, **kw):
+        heard.append('eu')
+
+    @on.deployed(where={'env': 'prod'}, priority=1)
+    def prod(event, **kw):
+        heard.append('prod')
+
+    @on.deployed(where={'env': 'prod'})
+    def answer(event, **kw):
+        return 'done'
+
+    @on.deployed(where={'env': 'prod', 'region': 'us'})
+    def us(event, **kw):
+        heard.append('us')
+
+    on.deployed.shout(env='prod', region='eu').should.equal('done')
+    heard.should.equal(['prod', 'eu'])
+
+    on.deployed.gather(env='prod', region='us').should.equal([None, None, 'done', None])
+    heard.should.equal(['prod', 'eu', 'prod', 'us'])
+
+    on.deployed.shout(env=['unhashable']).should.be.none
+
+
+def test_invalid_filters():
+    "Filters must be a dict of hashable values"
+
+    on = Speaker('on', ['deployed'])
+    on.for_decorator.when.called_with('deployed', lambda event: None, where=[('env', 'prod')]).should.throw(
+        TypeError, 'filters must be a dict')
+    on.for_decorator.when.called_with('deployed', lambda event: None, where={'env': []}).should.throw(
+        TypeError, 'filter values must be hashable')
+    on.hooks['deployed'].should.be.empty
+
+
+def test_shout_many_hands_chunks_to_filtered_batch_hooks():
+    "Speaker#shout_many hands whole chunks to batch hooks with filters"
+
+    on = Speaker('on', ['invoice_paid'])
+    batches = []
+
+    @on.invoice_paid(batch=True, where={'tenant': 'acme'})
+    def acme(event, batch, tenant):
+        batches.append(('acme', batch))
+
+    @on.invoice_paid(batch=True, where={'tenant': 'initech'})
+    def initech(event, batch, tenant):
+        batches.append(('initech', batch))
+
+    on.invoice_paid.shout_many([(10,), (20,), (30,)], tenant='acme').should.equal(3)
+    batches.should.equal([('acme', [(10,), (20,), (30,)])])
+
+
+def test_concurrent_registration_and_shouts():
+    "Hooks plugged and unplugged from many threads while shouting stay consistent"
+    import threading
+
+    on = Speaker('on', ['request'])
+    errors = []
+    stop = threading.Event()
+
+    @on.request
+    def steady(event, heard):
+        heard.append('steady')
+
+    def churn(index):
+        try:
+            for attempt in range(200):
+                listener = lambda event, heard: None
+                on.request(listener)
+                on.request.unplug(listener)
+        except Exception as exc:
+            errors.append(exc)
+
+    def shout():
+        try:
+            while not stop.is_set():
+                heard = []
+                on.request.shout(heard)
+                if heard != ['steady']:
+                    errors.append(heard)
+        except Exception as exc:
+            errors.append(exc)
+
+    shouters = [threading.Thread(target=shout) for index in range(2)]
+    writers = [threading.Thread(target=churn, args=(index,)) for index in range(4)]
+    for thread in shouters + writers:
+        thread.start()
+
+    for thread in writers:
+        thread.join()
+
+    stop.set()
+    for thread in shouters:
+        thread.join()
+
+    errors.should.be.empty
+    on.hooks['request'].should.have.length_of(1)
+    on._identities['request'].should.have.length_of(1)
+    on.listeners('request').should.have.length_of(1)
+
+
+def test_weak_hooks_collected_during_a_write_are_swept_afterwards():
+    "Weak hooks collected while the write lock is held are removed once it is released"
+
+    on = Speaker('on', ['request'])
+
+    @on.request(weak=True)
+    def listener(event):
+        return 'weak'
+
+    hook, = on.hooks['request']
+
+    with on._writing():
+        on._forget('request', hook)
+        on.hooks['request'].should.have.length_of(1)
+
+    on.hooks['request'].should.be.empty
+    on.request.shout().should.be.none
+
+
+def test_hook_snapshots_are_published_once_per_change():
+    "Speaker#hooks hands out the same tuple until the hooks of the action change"
+
+    on = Speaker('on', ['ready'])
+    first = on.ready(lambda event: None)
+    on.ready(lambda event: None, priority=5)
+
+    snapshot = on.hooks['ready']
+    snapshot.should.be.a(tuple)
+    on.hooks['ready'].should.be(snapshot)
+    [hook.priority for hook in snapshot].should.equal([5, 0])
+
+    on.ready.unplug(first)
+    on.hooks['ready'].shouldnt.be(snapshot)
+    on.hooks['ready'].should.have.length_of(1)
+    snapshot.should.have.length_of(2)
+
+
+def test_shouts_propagate_to_parent_speakers():
+    "Speaker(parent=) makes shouts reach the hooks of the ancestors, closest first"
+
+    everything = Speaker('everything', [])
+    http = Speaker('http', ['request'], parent=everything)
+    api = Speaker('http.api', ['request'], parent=http)
+    heard = []
+
+    @everything.subscribe('*')
+    def catch_all(event, path):
+        heard.append(('everything', event.name, path))
+
+    @http.request
+    def log(event, path):
+        heard.append(('http', event.name, path))
+
+    @api.request
+    def route(event, path):
+        heard.append(('api', event.name, path))
+
+    api.request.shout('/users')
+    heard.should.equal([
+        ('api', 'http_api', '/users'),
+        ('http', 'http_api', '/users'),
+        ('everything', 'http_api', '/users'),
+    ])
+    api.listeners('request').should.have.length_of(3)
+
+    del heard[:]
+    http.shout('request', '/')
+    api.shout('undeclared', '/')
+    heard.should.equal([('http', 'http', '/'), ('everything', 'http', '/'), ('everything', 'http_api', '/')])
+
+
+def test_children_are_recompiled_when_ancestors_change():
+    "Plugging or unplugging hooks of an ancestor rebuilds the plans of its descendants"
+
+    root = Speaker('root', ['ready'])
+    middle = Speaker('middle', ['ready'], parent=root)
+    leaf = Speaker('leaf', ['ready'], parent=middle)
+    leaf.ready.shout().should.be.none
+
+    @root.ready
+    def answer(event):
+        return 'root'
+
+    leaf.ready.shout().should.equal('root')
+
+    middle.ready(lambda event: 'middle')
+    leaf.ready.shout().should.equal('middle')
+
+    root.release()
+    middle.release()
+    leaf.ready.shout().should.be.none
+    leaf.listeners('ready').should.be.empty
+
+
+def test_reparenting_speakers():
+    "Speaker#set_parent moves a speaker in the tree and refuses cycles"
+
+    first = Speaker('first', ['ready'])
+    second = Speaker('second', ['ready'])
+    child = Speaker('child', ['ready'], parent=first)
+    first.ready(lambda event: 'first')
+    second.ready(lambda event: 'second')
+
+    child.ready.shout().should.equal('first')
+    child.set_parent(second)
+    child.ready.shout().should.equal('second')
+    list(first._children).should.be.empty
+
+    child.set_parent(None)
+    child.ready.shout().should.be.none
+    second.set_parent.when.called_with(second).should.throw(ValueError, 'cannot be an ancestor of itself')
+    child.set_parent(second)
+    second.set_parent.when.called_with(child).should.throw(ValueError)
+    second.parent.should.be.none
+
+
+def test_inherited_hooks_keep_the_exception_handler_of_their_speaker():
+    "Exceptions of hooks inherited from a parent go to the exception handler of the parent"
+
+    handled = []
+    http = Speaker('http', ['request'])
+    api = Speaker('api', ['request'], parent=http)
+
+    @http.exception_handler
+    def parent_handler(speaker, exception, args, kwargs):
+        handled.append(('http', str(exception)))
+
+    @api.exception_handler
+    def child_handler(speaker, exception, args, kwargs):
+        handled.append(('api', str(exception)))
+
+    @http.request
+    def audit(event, path):
+        raise ValueError('audit failed')
+
+    @api.request
+    def route(event, path):
+        raise ValueError('no route')
+
+    api.shout('request', '/users')
+    api.gather('request', '/users')
+    handled.should.equal([('api', 'no route'), ('http', 'audit failed')] * 2)
+
+def test_unheard_undeclared_actions_are_not_compiled():
+    "Shouting undeclared actions no hook can hear stores nothing, with or without parents"
+
+    root = Speaker('root', ['ready'])
+    child = Speaker('child', ['ready'], parent=root)
+
+    for index in range(100):
+        child.shout('unknown_{0}'.format(index)).should.be.none
+
+    sorted(child._plans).should.equal(['ready'])
+    sorted(root._plans).should.equal(['ready'])
+
+    heard = []
+    root.subscribe('unknown_*', lambda event: heard.append(event.name))
+    child.shout('unknown_1')
+    heard.should.equal(['child'])
+
+    child.subscribe('unknown_*', lambda event: heard.append('own'))
+    root.release('unknown_*')
+    child.shout('unknown_1')
+    heard.should.equal(['child', 'own'])
+
+
+def test_patterns_plugged_into_parents_reach_plans_their_children_compiled():
+    "A pattern plugged into a parent is heard by undeclared actions its children already compiled"
+
+    heard = []
+    root = Speaker('jobs', [])
+    child = Speaker('worker', [], parent=root)
+    child.subscribe('job_*', lambda event: heard.append('child'))
+    child.shout('job_1')
+    root._plans.should_not.contain('job_1')
+
+    root.subscribe('job_*', lambda event: heard.append('root'))
+    child.shout('job_1')
+    heard.should.equal(['child', 'child', 'root'])
@@ -0,0 +1,135 @@
+# #!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# <speakers - simple signal system for python>
+# Copyright (C) <2013>  Gabriel Falcão <gabriel@nacaolivre.org>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import os
+import tempfile
+
+from speakers.bus import Speaker
+from speakers.tracing import FileExporter, MemoryExporter, Traced, Tracer
+
+
+def test_sampled_shout_exports_a_span_per_hook():
+    "Speaker#enable_tracing exports a shout span with a child span per hook"
+
+    on = Speaker('on', ['request'])
+    exporter = MemoryExporter()
+    tracer = on.enable_tracing(exporter)
+
+    @on.request
+    def first(event):
+        pass
+
+    @on.request
+    def second(event):
+        return 'done'
+
+    @on.request
+    def third(event):
+        return 'never'
+
+    on.request.shout().should.equal('done')
+    tracer.flush(5).should.be.true
+
+    root, one, two = exporter.spans
+    root.name.should.equal('on:request')
+    root.parent_id.should.be.none
+    one.parent_id.should.equal(root.span_id)
+    two.trace_id.should.equal(root.trace_id)
+    one.name.should.equal('on:request[tests.test_tracing:first:43]')
+    [one.stopped, two.stopped].should.equal([False, True])
+    [span.outcome for span in exporter.spans].should.equal(['ok', 'ok', 'ok'])
+    root.duration.should.be.greater_than_or_equal_to(two.duration)
+    on.disable_tracing()
+
+
+def test_failing_hook_spans():
+    "Hooks that raise get an error span"
+
+    on = Speaker('on', ['request'])
+    tracer = on.enable_tracing()
+
+    @on.exception_handler
+    def handle(speaker, exception, args, kwargs):
+        pass
+
+    @on.request
+    def broken(event):
+        raise ValueError('boom')
+
+    on.shout('request')
+    tracer.flush(5)
+    [span.outcome for span in tracer.exporter.spans].should.equal(['ok', 'error'])
+    on.disable_tracing()
+
+
+def test_unsampled_shouts_are_not_traced():
+    "A rate of 0 never traces and disabling tracing restores the plain plan"
+
+    on = Speaker('on', ['request'])
+    on.request(lambda event: 'ok')
+
+    tracer = on.enable_tracing(rate=0)
+    on.shout('request').should.equal('ok')
+    tracer.flush(5)
+    tracer.exporter.spans.should.be.empty
+
+    on.disable_tracing()
+    on._plans['request'].shouldnt.be.a(Traced)
+
+    def make_tracer(exporter, **options):
+        return Tracer(exporter, **options)
+
+    make_tracer.when.called_with(MemoryExporter(), rate=2).should.throw(ValueError)
+
+
+def test_file_exporter_writes_one_line_per_span():
+    "FileExporter appends a compact line per span"
+
+    path = os.path.join(tempfile.mkdtemp(), 'spans.log')
+    on = Speaker('on', ['request'])
+    on.request(lambda event: None)
+    on.enable_tracing(FileExporter(path))
+    on.shout('request')
+    on.disable_tracing()
+
+    with io.open(path, encoding='utf-8') as stream:
+        lines = stream.read().splitlines()
+
+    lines.should.have.length_of(2)
+    root, hook = [line.split(' ') for line in lines]
+    root[2].should.equal('-')
+    hook[2].should.equal(root[1])
+    root[5:].should.equal(['ok', '0', 'on:request'])
+
+
+def test_tracer_drops_spans_when_full():
+    "Tracer drops new spans once maxsize spans are waiting"
+
+    tracer = Tracer(MemoryExporter(), maxsize=1)
+    tracer.close()
+    tracer.export([object(), object()])
+    tracer.dropped.should.equal(2)